@@ -1,24 +1,6 @@
 from graphics import *
 from button import Button
-from random import *
-
-class Card:
-    def __init__(self, rank, suit):
-        self.rank = rank
-        self.suit = suit
-
-    def __str__(self):
-        return f"{self.rank}{self.suit}"
-
-class Deck:
-    def __init__(self):
-        ranks = "23456789TJQKA"
-        suits = "♣♦♥♠"
-        self.cards = [Card(rank, suit) for rank in ranks for suit in suits]
-        random.shuffle(self.cards)
-
-    def deal(self):
-        return self.cards.pop()
+from cards import Card, Deck
 
 class PokerHand:
     def __init__(self, cards):
@@ -28,7 +10,7 @@ class PokerHand:
         return " ".join(map(str, self.cards))
 
     def get_category(self):
-        ranks = sorted([card.rank for card in self.cards])
+        ranks = sorted([card.get_rank_value() for card in self.cards])
         suits = [card.suit for card in self.cards]
 
         flush = len(set(suits)) == 1
@@ -54,13 +36,13 @@ class PokerHand:
             return "High card"
 
     def get_pair_rank(self):
-        ranks = sorted([card.rank for card in self.cards], reverse=True)
+        ranks = sorted([card.get_rank_value() for card in self.cards], reverse=True)
         for rank in ranks:
             if ranks.count(rank) == 2:
                 return rank
 
     def get_highest_rank(self):
-        return max([card.rank for card in self.cards])
+        return max([card.get_rank_value() for card in self.cards])
 
 class PSGame:
     def __init__(self, win):
@@ -82,7 +64,7 @@ class PSGame:
 
         self.player_hand_cards = []
         for i in range(2):
-            card = self.deck.deal()
+            card = self.deck.deal_card()
             self.player_hand.append(card)
             card_label = Text(Point(150 + i*50, 100), str(card))
             card_label.draw(self.win)
@@ -107,28 +89,28 @@ class PSGame:
 
         if self.betting_round == 2:
             for i in range(3):
-                card = self.deck.deal()
+                card = self.deck.deal_card()
                 self.player_hand.append(card)
                 card_label = Text(Point(150 + i * 50, 100), str(card))
                 card_label.draw(self.win)
                 self.player_hand_cards.append(card_label)
 
         elif self.betting_round == 3:
-            card = self.deck.deal()
+            card = self.deck.deal_card()
             self.player_hand.append(card)
             card_label = Text(Point(150 + 3 * 50, 100), str(card))
             card_label.draw(self.win)
             self.player_hand_cards.append(card_label)
 
         elif self.betting_round == 4:
-            card = self.deck.deal()
+            card = self.deck.deal_card()
             self.player_hand.append(card)
             card_label = Text(Point(150 + 4 * 50, 100), str(card))
             card_label.draw(self.win)
             self.player_hand_cards.append(card_label)
 
             for i in range(2):
-                card = self.deck.deal()
+                card = self.deck.deal_card()
                 self.dealer_hand.append(card)
                 self.dealer_hand_cards[i].setText(str(card))
 
@@ -141,11 +123,11 @@ class PSGame:
         self.fold_button.deactivate()
 
         if self.betting_round == 1:
-            self.dealer_hand.extend([self.deck.deal() for i in range(5)])
+            self.dealer_hand.extend([self.deck.deal_card() for i in range(5)])
         elif self.betting_round == 2:
-            self.dealer_hand.extend([self.deck.deal() for i in range(2)])
+            self.dealer_hand.extend([self.deck.deal_card() for i in range(2)])
         elif self.betting_round == 3:
-            self.dealer_hand.extend([self.deck.deal()])
+            self.dealer_hand.extend([self.deck.deal_card()])
 
         self.end_game()
 
@@ -196,11 +178,9 @@ class PSGame:
         for card_label in self.player_hand_cards + self.dealer_hand_cards:
             card_label.undraw()
 
-        self.play()
-
     def play(self):
-        self.win.getMouse()
-        self.bet()
+        # The buttons run bet and fold when clicked
+        self.win.waitForClose()
 
     def run(self):
         self.play()
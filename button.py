@@ -6,9 +6,12 @@ class Button:
     """A button is a labeled rectangle in a window.
     It is activated or deactivated with the activate()
     and deactivate() methods. The clicked(p) method
-    returns true if the button is active and p is inside it."""
+    returns true if the button is active and p is inside it.
+    A button given a command calls it (with no arguments) when
+    clicked while active; the window dispatches those clicks itself,
+    so they never reach getMouse."""
 
-    def __init__(self, win, center, width, height, label):
+    def __init__(self, win, center, width, height, label, command=None):
         """ Creates a rectangular button, eg:
         qb = Button(myWin, centerPoint, width, height, 'Quit') """ 
 
@@ -23,11 +26,18 @@ class Button:
         self.rect.draw(win)
         self.label = Text(center, label)
         self.label.draw(win)
+        self.command = command
+        self.hotspot = None
+        if command is not None:
+            self.hotspot = win.addHotspot(p1, p2, lambda p: self.command())
         self.deactivate()
 
     def undraw(self):
         self.rect.undraw()
         self.label.undraw()
+        if self.hotspot is not None:
+            self.hotspot.remove()
+            self.hotspot = None
 
     def clicked(self, p):
         "Returns true if button active and p is inside"
@@ -44,9 +54,13 @@ class Button:
         self.label.setFill('black')
         self.rect.setWidth(2)
         self.active = True
+        if self.hotspot is not None:
+            self.hotspot.active = True
 
     def deactivate(self):
         "Sets this button to 'inactive'."
         self.label.setFill('darkgrey')
         self.rect.setWidth(1)
         self.active = False
+        if self.hotspot is not None:
+            self.hotspot.active = False
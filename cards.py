@@ -0,0 +1,145 @@
+# cards.py
+"""Compact playing cards.
+
+Every card is a small integer code in range(52), rank major:
+code = rank * 4 + suit, with rank indexing RANKS and suit indexing
+SUITS. This is the layout handeval uses. Only 52 Card objects ever
+exist. Card(rank, suit) hands back the shared one, and each holds
+nothing but its code. A Deck keeps undealt codes in a byte array, and
+a set of cards can be packed into a 52-bit mask with mask_of()."""
+
+from array import array
+import random
+
+RANKS = "23456789TJQKA"
+SUITS = "♣♦♥♠"
+
+# Picture files for the card faces, by code, and for the back
+FACE_IMAGES = tuple(RANKS[code >> 2] + SUITS[code & 3] + ".gif" for code in range(52))
+BACK_IMAGE = "back.gif"
+
+# The same pictures in one sprite sheet (a graphics.Atlas): cell k is
+# the face of card code k, 13 to a row, and cell BACK_CELL the back.
+# Running this module builds the sheet from the separate files.
+ATLAS_IMAGE = "cards.gif"
+ATLAS_COLUMNS, ATLAS_ROWS = 13, 5
+BACK_CELL = 52
+
+# O(1) replacements for RANKS.index / SUITS.index
+RANK_VALUES = {rank: i for i, rank in enumerate(RANKS)}
+SUIT_VALUES = {suit: i for i, suit in enumerate(SUITS)}
+
+
+class Card:
+
+    """A playing card. Cards are shared, so compare them with == or is."""
+
+    __slots__ = ("code",)
+
+    def __new__(cls, rank, suit):
+        return _CARDS[RANK_VALUES[rank] * 4 + SUIT_VALUES[suit]]
+
+    @staticmethod
+    def from_code(code):
+        """Return the card with the given code (0..51)."""
+        return _CARDS[code]
+
+    def __repr__(self):
+        return "Card('{}', '{}')".format(self.get_rank(), self.get_suit())
+
+    def __str__(self):
+        return f"{self.get_rank()}{self.get_suit()}"
+
+    def __reduce__(self):
+        return (Card.from_code, (self.code,))
+
+    @property
+    def rank(self):
+        return RANKS[self.code >> 2]
+
+    @property
+    def suit(self):
+        return SUITS[self.code & 3]
+
+    def get_rank(self):
+        return RANKS[self.code >> 2]
+
+    def get_suit(self):
+        return SUITS[self.code & 3]
+
+    def get_rank_value(self):
+        """Rank as an integer, 0 for a deuce up to 12 for an ace."""
+        return self.code >> 2
+
+    def get_suit_value(self):
+        """Suit as an integer index into SUITS."""
+        return self.code & 3
+
+    def get_mask(self):
+        """This card's bit in a 52-bit hand mask."""
+        return 1 << self.code
+
+
+def _make_card(code):
+    card = object.__new__(Card)
+    card.code = code
+    return card
+
+_CARDS = tuple(_make_card(code) for code in range(52))
+
+
+def mask_of(cards):
+    """Pack an iterable of cards into a 52-bit mask."""
+    mask = 0
+    for card in cards:
+        mask |= 1 << card.code
+    return mask
+
+
+def codes_in(mask):
+    """Return the card codes set in a 52-bit mask, lowest first."""
+    codes = []
+    while mask:
+        low = mask & -mask
+        codes.append(low.bit_length() - 1)
+        mask ^= low
+    return codes
+
+
+def cards_in(mask):
+    """Return the cards set in a 52-bit mask, lowest first."""
+    return [_CARDS[code] for code in codes_in(mask)]
+
+
+class Deck:
+    ranks = RANKS
+    suits = SUITS
+
+    def __init__(self, rng=None):
+        # rng is any random.Random-like object; defaults to the module
+        self.rng = rng or random
+        self.cards = array('B', range(52))
+        self.shuffle()
+
+    def __len__(self):
+        return len(self.cards)
+
+    def shuffle(self):
+        self.rng.shuffle(self.cards)
+
+    def deal_card(self):
+        return _CARDS[self.cards.pop()]
+
+    def deal_code(self):
+        return self.cards.pop()
+
+
+def card_atlas():
+    """The card pictures as a graphics.Atlas: the ATLAS_IMAGE sheet, or
+    FACE_IMAGES and BACK_IMAGE when the sheet has not been built"""
+    from graphics import Atlas
+    return Atlas(ATLAS_IMAGE, ATLAS_COLUMNS, ATLAS_ROWS, FACE_IMAGES + (BACK_IMAGE,))
+
+
+if __name__ == "__main__":
+    card_atlas().save(ATLAS_IMAGE)
@@ -0,0 +1,347 @@
+# equity.py
+"""Win/tie/loss odds for Poker Solitaire.
+
+The player knows their two hole cards and whatever community cards
+have been dealt; the dealer's two hole cards and the rest of the board
+are unknown. monte_carlo() estimates how often the player's final
+seven card hand beats the dealer's by dealing the unknown cards at
+random, many thousands of times, and evaluating the results in
+batches. exact() counts every possible deal instead, treating deals
+that differ only by a renaming of the suits as one.
+
+Cards may be given either as cards.Card objects or as card codes."""
+
+import itertools
+import math
+import random
+from statistics import NormalDist
+
+import handeval
+
+_np = False
+
+def _numpy():
+    # numpy makes the rollouts much faster but is not required. It is
+    # imported on first use, like handeval's tables are built then.
+    global _np
+    if _np is False:
+        try:
+            import numpy
+            _np = numpy
+        except ImportError:
+            _np = None
+    return _np
+
+STAGES = {0: "Pre-Flop", 3: "Flop", 4: "Turn", 5: "River"}
+
+
+class Equity:
+
+    """Outcome counts of the player's hand against the dealer's.
+    For a sampled result, interval() gives a confidence interval on the
+    equity (the chance of winning plus half the chance of a tie)."""
+
+    def __init__(self, wins, ties, losses, confidence=0.95, exact=False):
+        self.wins = wins
+        self.ties = ties
+        self.losses = losses
+        self.confidence = confidence
+        self.exact = exact
+
+    def __repr__(self):
+        return "Equity(wins={}, ties={}, losses={})".format(self.wins, self.ties,
+                                                            self.losses)
+
+    def __str__(self):
+        lo, hi = self.interval()
+        return "win {:.4f}  tie {:.4f}  loss {:.4f}  equity {:.4f} [{:.4f}, {:.4f}]".format(
+            self.win, self.tie, self.loss, self.equity, lo, hi)
+
+    @property
+    def trials(self):
+        return self.wins + self.ties + self.losses
+
+    @property
+    def win(self):
+        return self.wins / self.trials
+
+    @property
+    def tie(self):
+        return self.ties / self.trials
+
+    @property
+    def loss(self):
+        return self.losses / self.trials
+
+    @property
+    def equity(self):
+        return (self.wins + self.ties / 2) / self.trials
+
+    def half_width(self):
+        """Half the width of the confidence interval on equity."""
+        if self.exact:
+            return 0.0
+        n = self.trials
+        mean = self.equity
+        # Each trial scores 1, 1/2 or 0
+        var = (self.wins + self.ties / 4) / n - mean * mean
+        z = NormalDist().inv_cdf((1 + self.confidence) / 2)
+        return z * math.sqrt(max(var, 0.0) / n)
+
+    def interval(self):
+        h = self.half_width()
+        return max(self.equity - h, 0.0), min(self.equity + h, 1.0)
+
+
+def _codes(cards):
+    return [c.code if hasattr(c, "code") else int(c) for c in cards]
+
+
+def _check(hole, board):
+    if len(hole) != 2:
+        raise ValueError("the player must hold exactly two hole cards")
+    if len(board) not in STAGES:
+        raise ValueError("the board must hold 0, 3, 4 or 5 cards")
+    if len(set(hole + board)) != len(hole) + len(board):
+        raise ValueError("duplicate card")
+
+
+def monte_carlo(hole, board=(), trials=100000, seed=None, tolerance=None,
+                confidence=0.95, batch_size=10000):
+    """Estimate the player's odds by dealing the unknown cards at random.
+
+    Runs up to trials rollouts in batches of batch_size. If tolerance is
+    given, stops after the first batch whose confidence interval on the
+    equity has a half width of at most tolerance. The same seed always
+    gives the same result."""
+    if trials < 1:
+        raise ValueError("at least one trial is needed")
+    hole = _codes(hole)
+    board = _codes(board)
+    _check(hole, board)
+    known = set(hole + board)
+    rest = [c for c in range(52) if c not in known]
+    result = Equity(0, 0, 0, confidence)
+    np = _numpy()
+    if np is not None:
+        rng = np.random.default_rng(seed)
+        rollout = _numpy_rollouts
+    else:
+        rng = random.Random(seed)
+        rollout = _python_rollouts
+    while result.trials < trials:
+        n = min(batch_size, trials - result.trials)
+        wins, ties = rollout(rng, hole, board, rest, n)
+        result.wins += wins
+        result.ties += ties
+        result.losses += n - wins - ties
+        if tolerance is not None and result.half_width() <= tolerance:
+            break
+    return result
+
+
+def _numpy_rollouts(rng, hole, board, rest, n):
+    """Deal n random completions; return (wins, ties) for the player."""
+    np = _numpy()
+    rest = np.array(rest, dtype=np.int64)
+    draw = 7 - len(board)   # two dealer hole cards and the rest of the board
+    # The draw smallest of a row of random keys pick a uniformly random
+    # draw-subset of the unknown cards
+    keys = rng.random((n, len(rest)))
+    picks = rest[np.argpartition(keys, draw - 1, axis=1)[:, :draw]]
+    shared = np.empty((n, 5), dtype=np.int64)
+    shared[:, :len(board)] = board
+    shared[:, len(board):] = picks[:, 2:]
+    player = np.concatenate([np.broadcast_to(hole, (n, 2)), shared], axis=1)
+    dealer = np.concatenate([picks[:, :2], shared], axis=1)
+    diff = handeval.evaluate_batch(player) - handeval.evaluate_batch(dealer)
+    return int((diff > 0).sum()), int((diff == 0).sum())
+
+
+def _python_rollouts(rng, hole, board, rest, n):
+    draw = 7 - len(board)
+    evaluate = handeval.evaluate
+    wins = ties = 0
+    for _ in range(n):
+        picks = rng.sample(rest, draw)
+        shared = board + picks[2:]
+        p = evaluate(hole + shared)
+        d = evaluate(picks[:2] + shared)
+        if p > d:
+            wins += 1
+        elif p == d:
+            ties += 1
+    return wins, ties
+
+
+# Exact enumeration
+#
+# Two situations that differ only by a renaming of the suits have the
+# same odds. A situation's suit-isomorphism class is captured by its
+# signature: for every suit, the 13-bit masks of the ranks the player
+# holds and the ranks on the board in that suit, with the four
+# (hole, board) pairs sorted. exact() deals every completion of the
+# board, folds completions with equal signatures together and counts
+# the dealer's hole cards once per distinct final board.
+
+_river_cache = {}           # signature of a full board -> (wins, ties, losses)
+RIVER_CACHE_SIZE = 1 << 20
+
+_exact_cache = {}           # signature of an exact() query -> (wins, ties, losses)
+EXACT_CACHE_SIZE = 1 << 16
+
+
+def _signature(hole, board):
+    held = [0, 0, 0, 0]
+    shown = [0, 0, 0, 0]
+    for c in hole:
+        held[c & 3] |= 1 << (c >> 2)
+    for c in board:
+        shown[c & 3] |= 1 << (c >> 2)
+    return tuple(sorted(zip(held, shown), reverse=True))
+
+
+def _cards_of(signature):
+    """A representative (hole, board) for a signature."""
+    hole = []
+    board = []
+    for suit, (held, shown) in enumerate(signature):
+        for rank in range(13):
+            if held >> rank & 1:
+                hole.append(rank * 4 + suit)
+            if shown >> rank & 1:
+                board.append(rank * 4 + suit)
+    return hole, board
+
+
+def exact(hole, board=()):
+    """Count the player's wins, ties and losses over every possible
+    completion of the board and every pair of dealer hole cards.
+
+    The result is exact, but the work grows quickly with the number of
+    unknown board cards: the river and turn take milliseconds, the
+    flop well under a second, and pre-flop a minute or two."""
+    hole = _codes(hole)
+    board = _codes(board)
+    _check(hole, board)
+    key = _signature(hole, board)
+    if key not in _exact_cache:
+        known = set(hole + board)
+        rest = [c for c in range(52) if c not in known]
+        boards = {}
+        for extra in itertools.combinations(rest, 5 - len(board)):
+            sig = _signature(hole, board + list(extra))
+            boards[sig] = boards.get(sig, 0) + 1
+        if len(_exact_cache) >= EXACT_CACHE_SIZE:
+            _exact_cache.clear()
+        _exact_cache[key] = _count_rivers(boards)
+    wins, ties, losses = _exact_cache[key]
+    return Equity(wins, ties, losses, exact=True)
+
+
+def river_counts(hole, boards):
+    """Exact (wins, ties, losses) over every pair of dealer hole cards,
+    for each of several complete boards played with the same hole cards"""
+    hole = _codes(hole)
+    return _grade_rivers([_signature(hole, _codes(board)) for board in boards])
+
+
+def _count_rivers(boards):
+    # boards maps the signature of each distinct final board to the
+    # number of completions that share it
+    wins = ties = losses = 0
+    for (w, t, l), weight in zip(_grade_rivers(list(boards)), boards.values()):
+        wins += weight * w
+        ties += weight * t
+        losses += weight * l
+    return wins, ties, losses
+
+
+def _grade_rivers(signatures):
+    # Results for full-board signatures, grading only those not cached
+    todo = list({sig for sig in signatures if sig not in _river_cache})
+    if len(_river_cache) + len(todo) > RIVER_CACHE_SIZE:
+        _river_cache.clear()
+        todo = list(set(signatures))
+    if _numpy() is not None:
+        for i in range(0, len(todo), 512):
+            _numpy_rivers(todo[i:i + 512])
+    else:
+        for sig in todo:
+            _river_cache[sig] = _python_river(*_cards_of(sig))
+    return [_river_cache[sig] for sig in signatures]
+
+
+def _python_river(hole, board):
+    known = set(hole + board)
+    rest = [c for c in range(52) if c not in known]
+    player = handeval.evaluate(hole + board)
+    wins = ties = losses = 0
+    for pair in itertools.combinations(rest, 2):
+        dealer = handeval.evaluate(list(pair) + board)
+        if player > dealer:
+            wins += 1
+        elif player == dealer:
+            ties += 1
+        else:
+            losses += 1
+    return wins, ties, losses
+
+
+_pair_tables = None
+
+def _numpy_rivers(signatures):
+    # Grade every dealer pair against each final board in one batch
+    global _pair_tables
+    np = _numpy()
+    if _pair_tables is None:
+        pairs = np.array(list(itertools.combinations(range(52), 2)), dtype=np.int64)
+        _pair_tables = pairs, (np.int64(1) << pairs).sum(axis=1)
+    pairs, pair_masks = _pair_tables
+    holes, boards = zip(*map(_cards_of, signatures))
+    holes = np.array(holes, dtype=np.int64)
+    boards = np.array(boards, dtype=np.int64)
+    player = handeval.evaluate_batch(np.concatenate([holes, boards], axis=1))
+    known = (np.int64(1) << np.concatenate([holes, boards], axis=1)).sum(axis=1)
+    row, col = np.nonzero(known[:, None] & pair_masks[None, :] == 0)
+    dealer = handeval.evaluate_batch(np.concatenate([pairs[col], boards[row]], axis=1))
+    diff = np.sign(player[row] - dealer) + 1      # 0 loss, 1 tie, 2 win
+    counts = np.bincount(row * 3 + diff, minlength=3 * len(signatures))
+    for sig, (l, t, w) in zip(signatures, counts.reshape(-1, 3).tolist()):
+        _river_cache[sig] = (w, t, l)
+
+
+def test():
+    """Check exact() against a plain enumeration with no symmetry, and
+    monte_carlo() against exact()."""
+    rng = random.Random(3)
+    for size in (5, 4):
+        deal = rng.sample(range(52), 2 + size)
+        hole, board = deal[:2], deal[2:]
+        known = set(deal)
+        rest = [c for c in range(52) if c not in known]
+        counts = [0, 0, 0]
+        for extra in itertools.combinations(rest, 5 - size):
+            full = board + list(extra)
+            player = handeval.evaluate(hole + full)
+            for pair in itertools.combinations([c for c in rest if c not in extra], 2):
+                dealer = handeval.evaluate(list(pair) + full)
+                counts[(player > dealer) - (player < dealer) + 1] += 1
+        result = exact(hole, board)
+        assert (result.losses, result.ties, result.wins) == tuple(counts), (deal, result)
+
+    hole, board = [51, 47], [0, 4, 9]
+    truth = exact(hole, board).equity
+    lo, hi = monte_carlo(hole, board, seed=7).interval()
+    assert lo - 0.002 <= truth <= hi + 0.002, (truth, lo, hi)
+    try:
+        monte_carlo(hole, board, trials=0)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("monte_carlo accepted trials=0")
+    print("equity: ok")
+
+
+if __name__ == "__main__":
+    test()
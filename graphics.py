@@ -42,6 +42,7 @@ The library provides the following graphical objects:
     Oval
     Rectangle
     Polygon
+    Polyline
     Text
     Entry (for text-based input)
     Image
@@ -63,6 +64,40 @@ http://mcsp.wartburg.edu/zelle/python for a quick reference"""
 __version__ = "5.0beta"
 
 # Version 5
+#     * GraphicsObjects use __slots__, and their options are shared,
+#       read-only Styles; an option change swaps in another Style.
+#       Corners and anchors are kept as bare coordinates, not Points
+#     * Polygon keeps its vertices in a flat array('d'); added Polyline,
+#       Polygon.fromXY/getXY/setXY and Transform.screen_flat for
+#       shapes with very many vertices
+#     * Added Group, which draws, undraws, moves and recolors its
+#       members through one shared Tk tag
+#     * Undrawn objects leave their Tk items hidden and untagged in a
+#       per-window pool for later objects of the same class to reuse;
+#       added setAnchor and setPoints, which change drawn objects in place
+#     * Added hotspots (GraphWin.addHotspot), clickable rectangles found
+#       through a grid index and run straight from the click handler,
+#       and GraphWin.waitForClose
+#     * Added OffscreenWin (GraphWin(..., backend="offscreen")), which
+#       draws into memory with Pillow and saves frames to files; Images
+#       drawn there keep their pixels in Pillow too. test_offscreen
+#       (python graphics.py offscreen) runs without a display
+#     * Added Atlas (sprite sheets, or one file per cell until the sheet
+#       is built with Atlas.save) and Image.setRegion
+#     * Image files are decoded once and shared through a PhotoCache;
+#       added preloadImages, Image.setImage and Image.getImage
+#     * Added Image.to_array, Image.from_array and Image.put_rows for
+#       moving pixels to and from NumPy arrays in bulk
+#     * Added GraphWin.plot_many and plotPixels for plotting many pixels
+#       at once into a raster layer (one PhotoImage); rasterPlot sends
+#       plot and plotPixel there too
+#     * GraphWin keeps drawn objects in a dict by Tk id, and setCoords
+#       moves them in place instead of undrawing and redrawing
+#     * Added GraphWin.batch to group drawing into one update
+#     * Clicks and key presses are queued (with timestamps) rather than
+#       overwritten; added GraphWin.getEvents
+#     * getMouse and getKey wait in the Tk event loop instead of
+#       polling every 100 ms
 #     * update at bottom to fix MacOS issue causing askopenfile() to hang
 #     * update takes an optional parameter specifying update rate
 #     * Entry objects get focus when drawn
@@ -161,12 +196,42 @@ __version__ = "5.0beta"
 #     Added Entry boxes.
 
 import time, os, sys
+from array import array
+from collections import deque, namedtuple, OrderedDict
+from contextlib import contextmanager
 
 try:  # import as appropriate for 2.x vs. 3.x
    import tkinter as tk
 except:
    import Tkinter as tk
 
+_pil = None
+
+def _pillow():
+    # Pillow draws for OffscreenWin; it is only needed there
+    global _pil
+    if _pil is None:
+        try:
+            from PIL import Image, ImageColor, ImageDraw, ImageFont
+        except ImportError:
+            raise ImportError("OffscreenWin requires Pillow") from None
+        _pil = Image, ImageColor, ImageDraw, ImageFont
+    return _pil
+
+_np = False
+
+def _numpy():
+    # NumPy speeds up bulk plotting but is not required. It is imported
+    # on first use since importing it takes longer than everything else.
+    global _np
+    if _np is False:
+        try:
+            import numpy
+            _np = numpy
+        except ImportError:
+            _np = None
+    return _np
+
 
 ##########################################################################
 # Module Exceptions
@@ -182,8 +247,36 @@ BAD_OPTION = "Illegal option value"
 ##########################################################################
 # global variables and funtions
 
-_root = tk.Tk()
-_root.withdraw()
+# Hidden items a window keeps per class of object for reuse
+POOL_SIZE = 64
+
+# Distinct Styles kept for sharing before the table is started afresh
+STYLE_CACHE_SIZE = 4096
+
+# Side of the squares in which a window looks up hotspots, in pixels
+HOTSPOT_CELL = 32
+
+# Clicks and key presses each window keeps for getMouse, getKey, etc.
+EVENT_QUEUE_SIZE = 1024
+
+# A queued click or key press as returned by GraphWin.getEvents. kind is
+# "mouse" (x, y in window coordinates) or "key" (key is the key name);
+# time is when the event was received, as from time.time().
+InputEvent = namedtuple("InputEvent", "time kind x y key")
+
+# The hidden Tk root that every window belongs to. It is started by
+# _getRoot() when first needed, so importing this module needs neither
+# a display nor Tk start-up time, and Points, Transforms and the shapes
+# work without either until drawn.
+_root = None
+
+def _getRoot():
+    global _root
+    if _root is None:
+        _root = tk.Tk()
+        _root.withdraw()
+        _root.update()  # MacOS fix 1
+    return _root
 
 _update_lasttime = time.time()
 
@@ -198,40 +291,78 @@ def update(rate=None):
         else:
             _update_lasttime = now
 
-    _root.update()
+    if _root is not None:
+        _root.update()
 
 ############################################################################
 # Graphics classes start here
         
 class GraphWin(tk.Canvas):
 
-    """A GraphWin is a toplevel window for displaying graphics."""
+    """A GraphWin is a toplevel window for displaying graphics.
+    GraphWin(..., backend="offscreen") makes an OffscreenWin, which
+    draws into memory instead."""
+
+    def __new__(cls, *args, backend="tk", **kw):
+        if backend == "offscreen":
+            cls = OffscreenWin
+        elif backend != "tk":
+            raise GraphicsError(BAD_OPTION)
+        return tk.Canvas.__new__(cls)
 
     def __init__(self, title="Graphics Window",
-                 width=200, height=200, autoflush=True):
+                 width=200, height=200, autoflush=True, backend="tk"):
         assert type(title) == type(""), "Title must be a string"
-        master = tk.Toplevel(_root)
+        master = tk.Toplevel(_getRoot())
         master.protocol("WM_DELETE_WINDOW", self.close)
         tk.Canvas.__init__(self, master, width=width, height=height,
                            highlightthickness=0, bd=0)
         self.master.title(title)
         self.pack()
         master.resizable(0,0)
+        self._initState(width, height, autoflush)
+        self.bind("<Button-1>", self._onClick)
+        self.bind_all("<Key>", self._onKey)
+        master.lift()
+        # Written on every click, key press and close, so that waits
+        # for input can block in Tk's event loop instead of polling
+        self._inputEvent = tk.IntVar(_getRoot())
+        if autoflush: _getRoot().update()
+
+    def _initState(self, width, height, autoflush):
+        # The window's state apart from Tk
         self.foreground = "black"
-        self.items = []
+        self.items = {}     # drawn objects by Tk id, in drawing order
         self.mouseX = None
         self.mouseY = None
-        self.bind("<Button-1>", self._onClick)
-        self.bind_all("<Key>", self._onKey)
         self.height = int(height)
         self.width = int(width)
         self.autoflush = autoflush
         self._mouseCallback = None
         self.trans = None
         self.closed = False
-        master.lift()
         self.lastKey = ""
-        if autoflush: _root.update()
+        # Input waiting to be read, oldest first, as (time, x, y) in
+        # screen coordinates and (time, key). When a queue is full the
+        # oldest entry is dropped.
+        self._clicks = deque(maxlen=EVENT_QUEUE_SIZE)
+        self._keys = deque(maxlen=EVENT_QUEUE_SIZE)
+        # Nesting depth of batch() blocks, and the items whose options
+        # changed inside them
+        self._batchDepth = 0
+        self._pending = {}
+        # When rasterPlot is true, plot and plotPixel set pixels of the
+        # raster layer instead of creating a canvas item per pixel
+        self.rasterPlot = False
+        self._raster = None
+        # Clickable areas, in the order added, and a grid of the ones
+        # overlapping each HOTSPOT_CELL square of the window, built when
+        # first needed
+        self._hotspots = {}
+        self._hotspotGrid = None
+        # Hidden items left by undrawn objects, by object class, for
+        # objects of the same class drawn later to take over
+        self._pool = {}
 
     def __repr__(self):
         if self.isClosed():
@@ -250,18 +381,31 @@ class GraphWin(tk.Canvas):
 
     def _onKey(self, evnt):
         self.lastKey = evnt.keysym
+        self._keys.append((time.time(), evnt.keysym))
+        self._inputArrived()
+
+    def _inputArrived(self):
+        self._inputEvent.set(1)
+
+    def _waitInput(self):
+        # Process events until the next click, key press or close
+        self.wait_variable(self._inputEvent)
 
 
     def setBackground(self, color):
         """Set background color of the window"""
         self.__checkOpen()
         self.config(bg=color)
-        self.__autoflush()
+        self._autoflush()
         
     def setCoords(self, x1, y1, x2, y2):
         """Set coordinates of window to run from (x1,y1) in the
         lower-left corner to (x2,y2) in the upper-right corner."""
-        self.trans = Transform(self.width, self.height, x1, y1, x2, y2)
+        trans = Transform(self.width, self.height, x1, y1, x2, y2)
+        if self.trans is not None and vars(trans) == vars(self.trans):
+            return          # nothing on screen would change
+        self.trans = trans
+        self._hotspotGrid = None
         self.redraw()
 
     def close(self):
@@ -270,7 +414,8 @@ class GraphWin(tk.Canvas):
         if self.closed: return
         self.closed = True
         self.master.destroy()
-        self.__autoflush()
+        self._inputArrived()        # wake up any getMouse or getKey
+        self._autoflush()
 
 
     def isClosed(self):
@@ -281,24 +426,88 @@ class GraphWin(tk.Canvas):
         return not self.closed
 
 
-    def __autoflush(self):
-        if self.autoflush:
-            _root.update()
+    def _autoflush(self):
+        # Called after every change to the window's contents
+        if self.autoflush and not self._batchDepth:
+            _getRoot().update()
+
+    @contextmanager
+    def batch(self):
+        """Group drawing into one update:
+
+            with win.batch():
+                ...draw, move and restyle objects...
+
+        Inside the block nothing is flushed to the screen, and repeated
+        option changes to an object are sent to Tk once, at the end.
+        Blocks may be nested; the outermost one does the update."""
+        self._batchDepth += 1
+        try:
+            yield self
+        finally:
+            self._batchDepth -= 1
+            if not self._batchDepth:
+                pending = self._pending
+                self._pending = {}
+                if not self.closed:
+                    for item in pending:
+                        if item.canvas is self:
+                            self.itemconfig(item.id, item.config)
+                    self._autoflush()
 
     
     def plot(self, x, y, color="black"):
         """Set pixel (x,y) to the given color"""
         self.__checkOpen()
         xs,ys = self.toScreen(x,y)
-        self.create_line(xs,ys,xs+1,ys, fill=color)
-        self.__autoflush()
+        if self.rasterPlot:
+            _putPixels(self.getRaster(), [xs], [ys], [color])
+        else:
+            self.create_line(xs,ys,xs+1,ys, fill=color)
+        self._autoflush()
         
     def plotPixel(self, x, y, color="black"):
         """Set pixel raw (independent of window coordinates) pixel
         (x,y) to color"""
         self.__checkOpen()
-        self.create_line(x,y,x+1,y, fill=color)
-        self.__autoflush()
+        if self.rasterPlot:
+            _putPixels(self.getRaster(), [x], [y], [color])
+        else:
+            self.create_line(x,y,x+1,y, fill=color)
+        self._autoflush()
+
+    def plot_many(self, xs, ys, colors="black"):
+        """Set pixel (xs[i],ys[i]) to colors[i] for every i, or to colors
+        if it is a single color. xs and ys may be lists or NumPy arrays
+        in window coordinates; colors may also be an (n,3) array of RGB
+        values in range(256). The pixels are written into the raster
+        layer, a few rows at a time."""
+        self.__checkOpen()
+        xs,ys = self.toScreenMany(xs,ys)
+        _putPixels(self.getRaster(), xs, ys, colors)
+        self._autoflush()
+
+    def plotPixels(self, xs, ys, colors="black"):
+        """plot_many with raw (screen) coordinates"""
+        self.__checkOpen()
+        _putPixels(self.getRaster(), xs, ys, colors)
+        self._autoflush()
+
+    def getRaster(self):
+        """Return the raster layer: a tk PhotoImage the size of the
+        window, shown as a single canvas item, made on first use. Pixels
+        never plotted are transparent."""
+        if self._raster is None:
+            self._raster = tk.PhotoImage(master=_getRoot(), width=self.width,
+                                         height=self.height)
+            self.create_image(0, 0, image=self._raster, anchor="nw")
+        return self._raster
+
+    def clearRaster(self):
+        """Make every pixel of the raster layer transparent again"""
+        if self._raster is not None:
+            self._raster.blank()
+            self._autoflush()
       
     def flush(self):
         """Update drawing to the window"""
@@ -307,53 +516,60 @@ class GraphWin(tk.Canvas):
         
     def getMouse(self):
         """Wait for mouse click and return Point object representing
-        the click"""
-        self.update()      # flush any prior clicks
-        self.mouseX = None
-        self.mouseY = None
-        while self.mouseX == None or self.mouseY == None:
-            self.update()
+        the click. Clicks are queued, so one made before the call is
+        returned at once."""
+        self.update()      # queue clicks Tk has already received
+        while not self._clicks:
             if self.isClosed(): raise GraphicsError("getMouse in closed window")
-            time.sleep(.1) # give up thread
-        x,y = self.toWorld(self.mouseX, self.mouseY)
-        self.mouseX = None
-        self.mouseY = None
+            self._waitInput()
+        t, x, y = self._clicks.popleft()
+        x,y = self.toWorld(x, y)
         return Point(x,y)
 
     def checkMouse(self):
-        """Return last mouse click or None if mouse has
-        not been clicked since last call"""
+        """Return the oldest queued mouse click or None if the mouse
+        has not been clicked since the last call"""
         if self.isClosed():
             raise GraphicsError("checkMouse in closed window")
         self.update()
-        if self.mouseX != None and self.mouseY != None:
-            x,y = self.toWorld(self.mouseX, self.mouseY)
-            self.mouseX = None
-            self.mouseY = None
+        if self._clicks:
+            t, x, y = self._clicks.popleft()
+            x,y = self.toWorld(x, y)
             return Point(x,y)
         else:
             return None
 
     def getKey(self):
         """Wait for user to press a key and return it as a string."""
-        self.lastKey = ""
-        while self.lastKey == "":
-            self.update()
+        self.update()
+        while not self._keys:
             if self.isClosed(): raise GraphicsError("getKey in closed window")
-            time.sleep(.1) # give up thread
-
-        key = self.lastKey
-        self.lastKey = ""
-        return key
+            self._waitInput()
+        return self._keys.popleft()[1]
 
     def checkKey(self):
-        """Return last key pressed or None if no key pressed since last call"""
+        """Return the oldest queued key press or "" if no key has been
+        pressed since the last call"""
         if self.isClosed():
             raise GraphicsError("checkKey in closed window")
         self.update()
-        key = self.lastKey
-        self.lastKey = ""
-        return key
+        if self._keys:
+            return self._keys.popleft()[1]
+        return ""
+
+    def getEvents(self):
+        """Return every queued click and key press as a list of
+        InputEvents in the order they happened, and empty the queues"""
+        if self.isClosed():
+            raise GraphicsError("getEvents in closed window")
+        self.update()
+        events = [InputEvent(t, "mouse", *self.toWorld(x, y), key="")
+                  for t, x, y in self._clicks]
+        events.extend(InputEvent(t, "key", None, None, key) for t, key in self._keys)
+        self._clicks.clear()
+        self._keys.clear()
+        events.sort(key=lambda e: e.time)
+        return events
             
     def getHeight(self):
         """Return the height of the window"""
@@ -370,35 +586,175 @@ class GraphWin(tk.Canvas):
         else:
             return x,y
                       
+    def toScreenMany(self, xs, ys):
+        trans = self.trans
+        if trans:
+            return trans.screen_many(xs,ys)
+        else:
+            return xs,ys
+
+    def toScreenFlat(self, xy):
+        trans = self.trans
+        if trans:
+            return trans.screen_flat(xy)
+        else:
+            return list(xy)
+
     def toWorld(self, x, y):
         trans = self.trans
         if trans:
             return self.trans.world(x,y)
         else:
             return x,y
+
+    def toWorldMany(self, xs, ys):
+        trans = self.trans
+        if trans:
+            return trans.world_many(xs,ys)
+        else:
+            return xs,ys
         
     def setMouseHandler(self, func):
         self._mouseCallback = func
-        
+
+    def addHotspot(self, p1, p2, command):
+        """Make the rectangle with corners p1 and p2 clickable: a click
+        inside it calls command with the clicked Point instead of being
+        queued for getMouse. Returns the Hotspot, which can be turned
+        off (active) or removed. Where hotspots overlap, the one added
+        last gets the click."""
+        hotspot = Hotspot(self, p1, p2, command)
+        self._hotspots[hotspot] = None
+        if self._hotspotGrid is not None:
+            self._gridAdd(hotspot)
+        return hotspot
+
+    def removeHotspot(self, hotspot):
+        # Removing a hotspot that is not in this window (or was already
+        # removed) does nothing
+        if hotspot not in self._hotspots:
+            return
+        del self._hotspots[hotspot]
+        if self._hotspotGrid is not None:
+            for cell in self._cellsOf(hotspot.bounds):
+                self._hotspotGrid[cell].remove(hotspot)
+
+    def hotspotAt(self, x, y):
+        """Returns the active hotspot that a click at screen position
+        (x,y) would go to, or None"""
+        if self._hotspotGrid is None:
+            self._hotspotGrid = {}
+            for hotspot in self._hotspots:
+                self._gridAdd(hotspot)
+        cell = self._hotspotGrid.get((int(x) // HOTSPOT_CELL, int(y) // HOTSPOT_CELL))
+        if cell:
+            for hotspot in reversed(cell):
+                x1, y1, x2, y2 = hotspot.bounds
+                if hotspot.active and x1 <= x <= x2 and y1 <= y <= y2:
+                    return hotspot
+        return None
+
+    def _gridAdd(self, hotspot):
+        # File hotspot under every grid cell its screen rectangle touches
+        x1, y1 = self.toScreen(hotspot.p1.x, hotspot.p1.y)
+        x2, y2 = self.toScreen(hotspot.p2.x, hotspot.p2.y)
+        hotspot.bounds = min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2)
+        for cell in self._cellsOf(hotspot.bounds):
+            self._hotspotGrid.setdefault(cell, []).append(hotspot)
+
+    def _cellsOf(self, bounds):
+        x1, y1, x2, y2 = [int(v) // HOTSPOT_CELL for v in bounds]
+        return [(i, j) for i in range(max(x1, 0), max(x2, 0) + 1)
+                       for j in range(max(y1, 0), max(y2, 0) + 1)]
+
+    def waitForClose(self):
+        """Process events, so that hotspots and Buttons with commands
+        respond to clicks, until the window is closed"""
+        if not self.closed:
+            self.wait_window(self)
+
     def _onClick(self, e):
         self.mouseX = e.x
         self.mouseY = e.y
+        hotspot = self.hotspotAt(e.x, e.y) if self._hotspots else None
+        if hotspot:
+            hotspot.command(Point(*self.toWorld(e.x, e.y)))
+            return
+        self._clicks.append((time.time(), e.x, e.y))
+        self._inputArrived()
         if self._mouseCallback:
             self._mouseCallback(Point(e.x, e.y))
 
+    def _imageFor(self, image):
+        # The picture to give create_image for an Image drawn here
+        img = image.img
+        Image.imageCache[image.imageId] = img   # keep it alive while drawn
+        return img
+
+    def preloadAtlas(self, atlas):
+        """Get every cell of atlas ready to be drawn here"""
+        atlas.preload()
+
+    def _reuseItem(self, item):
+        # Show a pooled item as item, or return None if there is none
+        ids = self._pool.get(type(item))
+        if not ids:
+            return None
+        id = ids.pop()
+        self.coords(id, *item._coords(self))
+        self.itemconfig(id, item._itemOptions(self), state="normal")
+        self.tag_raise(id)      # on top, like a new item
+        return id
+
+    def _recycleItem(self, item):
+        # Hide item's Tk item for reuse, or delete it if it cannot be
+        # reused or the pool is full
+        ids = self._pool.setdefault(type(item), [])
+        if item._pooled and len(ids) < POOL_SIZE and item._coords(self) is not None:
+            # Pooled items carry no tags, so a Group that item was in
+            # cannot show or move it again
+            self.itemconfig(item.id, state="hidden", tags="")
+            ids.append(item.id)
+        else:
+            self.delete(item.id)
+
     def addItem(self, item):
-        self.items.append(item)
+        self.items[item.id] = item
 
     def delItem(self, item):
-        self.items.remove(item)
+        self.items.pop(item.id, None)
 
     def redraw(self):
-        for item in self.items[:]:
-            item.undraw()
-            item.draw(self)
+        """Move every drawn object to where the current coordinates put
+        it. Objects are moved in place; only those that cannot report
+        their screen coordinates are undrawn and drawn again."""
+        with self.batch():
+            for item in list(self.items.values()):
+                coords = item._coords(self)
+                if coords is None:
+                    item.undraw()
+                    item.draw(self)
+                else:
+                    self.coords(item.id, *coords)
         self.update()
         
                       
+class Hotspot:
+
+    """A clickable rectangle of a window; see GraphWin.addHotspot"""
+
+    def __init__(self, win, p1, p2, command):
+        self.win = win
+        self.p1 = _Coord(p1.x, p1.y)
+        self.p2 = _Coord(p2.x, p2.y)
+        self.command = command
+        self.active = True
+        self.bounds = None      # screen rectangle, set by the window
+
+    def remove(self):
+        self.win.removeHotspot(self)
+
+
 class Transform:
 
     """Internal class for 2-D coordinate transformations"""
@@ -426,6 +782,118 @@ class Transform:
         y = self.ybase - ys*self.yscale
         return x,y
 
+    def screen_many(self,xs,ys):
+        # screen() for sequences of coordinates, rounded the same way
+        # (x+0.5 truncated); with NumPy the result is a pair of integer
+        # arrays, otherwise a pair of lists
+        np = _numpy()
+        if np is not None:
+            xs = np.trunc((np.asarray(xs, dtype=float) - self.xbase) / self.xscale + 0.5)
+            ys = np.trunc((self.ybase - np.asarray(ys, dtype=float)) / self.yscale + 0.5)
+            return xs.astype(np.int64), ys.astype(np.int64)
+        return ([int((x-self.xbase) / self.xscale + 0.5) for x in xs],
+                [int((self.ybase-y) / self.yscale + 0.5) for y in ys])
+
+    def world_many(self,xs,ys):
+        # world() for sequences of coordinates, as screen_many
+        np = _numpy()
+        if np is not None:
+            return (np.asarray(xs, dtype=float) * self.xscale + self.xbase,
+                    self.ybase - np.asarray(ys, dtype=float) * self.yscale)
+        return ([x*self.xscale + self.xbase for x in xs],
+                [self.ybase - y*self.yscale for y in ys])
+
+    def screen_flat(self,xy):
+        # screen() for a flat sequence x0,y0,x1,y1,...; returns a flat
+        # list of ints, as canvas.coords takes them
+        np = _numpy()
+        if np is not None:
+            xy = np.asarray(xy, dtype=float)
+            out = np.empty(len(xy), dtype=np.int64)
+            out[0::2] = np.trunc((xy[0::2] - self.xbase) / self.xscale + 0.5)
+            out[1::2] = np.trunc((self.ybase - xy[1::2]) / self.yscale + 0.5)
+            return out.tolist()
+        out = [0] * len(xy)
+        out[0::2] = [int((x-self.xbase) / self.xscale + 0.5) for x in xy[0::2]]
+        out[1::2] = [int((self.ybase-y) / self.yscale + 0.5) for y in xy[1::2]]
+        return out
+
+
+def _colorNames(colors, n):
+    # A list of n Tk colors from one color, a sequence of colors or an
+    # (n,3) array of RGB values
+    np = _numpy()
+    if isinstance(colors, str):
+        return [colors] * n
+    if np is not None and not isinstance(colors, (list, tuple)):
+        colors = np.asarray(colors)
+        if colors.ndim == 2:
+            # Format each distinct RGB value once
+            rgb = colors.astype(np.int64) @ np.array([1 << 16, 1 << 8, 1])
+            values, inverse = np.unique(rgb, return_inverse=True)
+            names = np.array(["#%06x" % v for v in values.tolist()], dtype=object)
+            return names[inverse.ravel()]
+        return colors.astype(object)
+    return [c if isinstance(c, str) else color_rgb(*c) for c in colors]
+
+
+def _pixelBlocks(xs, ys, colors, width, height):
+    """Group pixels into blocks that one PhotoImage.put can write:
+    yields (x, y, rows), rows being equal-length lists of colors for
+    rows y, y+1, ... starting at column x. Where several pixels land on
+    the same spot the last one wins; pixels outside width x height are
+    left out."""
+    np = _numpy()
+    names = _colorNames(colors, len(xs))
+    if np is not None:
+        xs = np.asarray(xs, dtype=np.int64).ravel()
+        ys = np.asarray(ys, dtype=np.int64).ravel()
+        keep = np.flatnonzero((xs >= 0) & (xs < width) & (ys >= 0) & (ys < height))
+        pos = ys[keep] * width + xs[keep]
+        order = np.argsort(pos, kind="stable")
+        keep = keep[order]
+        pos = pos[order]
+        last = np.ones(len(pos), dtype=bool)
+        last[:-1] = pos[1:] != pos[:-1]
+        names = np.asarray(names, dtype=object)[keep[last]].tolist()
+        pos = pos[last]
+        # Runs of adjacent pixels within a row
+        starts = np.flatnonzero((np.diff(pos) != 1) | (pos[1:] % width == 0)) + 1
+        bounds = [0] + starts.tolist() + [len(pos)]
+        pos = pos.tolist()
+        runs = [(pos[a] % width, pos[a] // width, names[a:b])
+                for a, b in zip(bounds, bounds[1:]) if b > a]
+    else:
+        pixels = {}
+        for x, y, c in zip(xs, ys, names):
+            if 0 <= x < width and 0 <= y < height:
+                pixels[int(y), int(x)] = c
+        runs = []
+        for (y, x) in sorted(pixels):
+            run = runs[-1] if runs else None
+            if run and run[1] == y and run[0] + len(run[2]) == x:
+                run[2].append(pixels[y, x])
+            else:
+                runs.append((x, y, [pixels[y, x]]))
+    # Stack runs that cover the same columns of consecutive rows
+    block = None
+    for x, y, row in runs:
+        if block and block[0] == x and block[1] + len(block[2]) == y \
+           and len(block[2][0]) == len(row):
+            block[2].append(row)
+        else:
+            if block:
+                yield block
+            block = (x, y, [row])
+    if block:
+        yield block
+
+
+def _putPixels(img, xs, ys, colors):
+    # Write pixels into a tk PhotoImage with as few puts as possible
+    for x, y, rows in _pixelBlocks(xs, ys, colors, img.width(), img.height()):
+        img.put(tuple(map(tuple, rows)), to=(x, y))
+
 
 # Default values for various item configuration options. Only a subset of
 #   keys may be present in the configuration dictionary for a given item
@@ -437,27 +905,108 @@ DEFAULT_CONFIG = {"fill":"",
       "justify":"center",
                   "font": ("helvetica", 12, "normal")}
 
+
+class Style(dict):
+
+    """The item options of an object, as a read-only dict. Objects
+    styled alike share one Style, and changing an option (replace)
+    gives the shared Style with that option changed instead of
+    altering this one."""
+
+    __slots__ = ("_key",)
+
+    _shared = {}        # frozenset of items -> Style
+    _defaults = {}      # tuple of option names -> Style
+    _changes = {}       # (key, option, setting) -> result of replace
+
+    def __init__(self, *args, **kw):
+        dict.__init__(self, *args, **kw)
+        self._key = None        # the key in _shared, if shared
+
+    @classmethod
+    def of(cls, options):
+        """The Style with the DEFAULT_CONFIG values of options"""
+        options = tuple(options)
+        style = cls._defaults.get(options)
+        if style is None:
+            style = cls._share({option: DEFAULT_CONFIG[option] for option in options})
+            cls._defaults[options] = style
+        return style
+
+    @classmethod
+    def _share(cls, options):
+        try:
+            key = frozenset(options.items())
+        except TypeError:   # an unhashable value; not shared
+            return cls(options)
+        shared = cls._shared
+        style = shared.get(key)
+        if style is None:
+            if len(shared) >= STYLE_CACHE_SIZE:
+                shared.clear()
+            style = shared[key] = cls(options)
+            style._key = key
+        return style
+
+    def replace(self, option, setting):
+        """The Style that is this one with option set to setting"""
+        # Repeated changes are looked up rather than worked out again
+        change = None
+        if self._key is not None:
+            try:
+                return Style._changes[self._key, option, setting]
+            except KeyError:
+                change = self._key, option, setting
+            except TypeError:   # an unhashable setting
+                pass
+        if option in self and self[option] == setting:
+            style = self
+        else:
+            options = dict(self)
+            options[option] = setting
+            style = self._share(options)
+        if change is not None:
+            changes = Style._changes
+            if len(changes) >= STYLE_CACHE_SIZE:
+                changes.clear()
+            changes[change] = style
+        return style
+
+    # Being read-only, a Style is its own copy; pickling shares the
+    # unpickled one again
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return (Style._share, (dict(self),))
+
+    def _readOnly(self, *args, **kw):
+        raise TypeError("Styles are shared and read-only; use replace")
+
+    __setitem__ = __delitem__ = __ior__ = _readOnly
+    clear = pop = popitem = setdefault = update = _readOnly
+
+
 class GraphicsObject:
 
     """Generic base class for all of the drawable objects"""
     # A subclass of GraphicsObject should override _draw and
-    #   and _move methods.
+    #   and _move methods, and list its own attributes in __slots__.
+
+    # When an object is drawn, canvas is set to the GraphWin(canvas)
+    #    object where it is drawn and id is the TK identifier of the
+    #    drawn shape. config is the object's Style.
+    __slots__ = ("canvas", "id", "config")
     
     def __init__(self, options):
         # options is a list of strings indicating which options are
         # legal for this object.
-        
-        # When an object is drawn, canvas is set to the GraphWin(canvas)
-        #    object where it is drawn and id is the TK identifier of the
-        #    drawn shape.
         self.canvas = None
         self.id = None
-
-        # config is the dictionary of configuration options for the widget.
-        config = {}
-        for option in options:
-            config[option] = DEFAULT_CONFIG[option]
-        self.config = config
+        self.config = Style.of(options)
         
     def setFill(self, color):
         """Set interior color to color"""
@@ -481,10 +1030,11 @@ class GraphicsObject:
         if self.canvas and not self.canvas.isClosed(): raise GraphicsError(OBJ_ALREADY_DRAWN)
         if graphwin.isClosed(): raise GraphicsError("Can't draw to closed window")
         self.canvas = graphwin
-        self.id = self._draw(graphwin, self.config)
+        self.id = graphwin._reuseItem(self)
+        if self.id is None:
+            self.id = self._draw(graphwin, self.config)
         graphwin.addItem(self)
-        if graphwin.autoflush:
-            _root.update()
+        graphwin._autoflush()
         return self
 
             
@@ -495,10 +1045,9 @@ class GraphicsObject:
         
         if not self.canvas: return
         if not self.canvas.isClosed():
-            self.canvas.delete(self.id)
+            self.canvas._recycleItem(self)
             self.canvas.delItem(self)
-            if self.canvas.autoflush:
-                _root.update()
+            self.canvas._autoflush()
         self.canvas = None
         self.id = None
 
@@ -519,8 +1068,7 @@ class GraphicsObject:
                 x = dx
                 y = dy
             self.canvas.move(self.id, x, y)
-            if canvas.autoflush:
-                _root.update()
+            canvas._autoflush()
            
     def _reconfig(self, option, setting):
         # Internal method for changing configuration of the object
@@ -528,12 +1076,14 @@ class GraphicsObject:
         #    dictionary for this object
         if option not in self.config:
             raise GraphicsError(UNSUPPORTED_METHOD)
-        options = self.config
-        options[option] = setting
-        if self.canvas and not self.canvas.isClosed():
-            self.canvas.itemconfig(self.id, options)
-            if self.canvas.autoflush:
-                _root.update()
+        options = self.config = self.config.replace(option, setting)
+        canvas = self.canvas
+        if canvas and not canvas.isClosed():
+            if canvas._batchDepth:
+                canvas._pending[self] = True    # sent when the batch ends
+            else:
+                canvas.itemconfig(self.id, options)
+                canvas._autoflush()
 
 
     def _draw(self, canvas, options):
@@ -546,20 +1096,70 @@ class GraphicsObject:
         """updates internal state of object to move it dx,dy units"""
         pass # must override in subclass
 
+    def _coords(self, canvas):
+        """Returns the screen coordinates of the drawn figure on canvas,
+        as a flat list, or None if they cannot be set in place"""
+        return None
+
+    # Whether an undrawn object's Tk item may be kept for reuse
+    _pooled = True
+
+    def _itemOptions(self, canvas):
+        """Returns the options that set up a reused Tk item as this"""
+        return self.config
+
+    def _updateCoords(self):
+        # Move the drawn item to where the object now is
+        canvas = self.canvas
+        if canvas and not canvas.isClosed():
+            canvas.coords(self.id, *self._coords(canvas))
+            canvas._autoflush()
+
+
+class _Coord:
+
+    # A bare position in world coordinates. Objects keep their corners
+    # and anchors as these, with no canvas, id or style; Points, which
+    # can be drawn, are only made for what the methods take and return.
+
+    __slots__ = ("x", "y")
+
+    def __init__(self, x, y):
+        self.x = float(x)
+        self.y = float(y)
+
+    def __repr__(self):
+        return "_Coord({}, {})".format(self.x, self.y)
+
+    def getX(self): return self.x
+    def getY(self): return self.y
+
+    def point(self):
+        return Point(self.x, self.y)
+
          
 class Point(GraphicsObject):
+
+    __slots__ = ("x", "y")
+
     def __init__(self, x, y):
-        GraphicsObject.__init__(self, ["outline", "fill"])
-        self.setFill = self.setOutline
+        self.canvas = None
+        self.id = None
+        self.config = _POINT_STYLE
         self.x = float(x)
         self.y = float(y)
 
+    setFill = GraphicsObject.setOutline
+
     def __repr__(self):
         return "Point({}, {})".format(self.x, self.y)
         
     def _draw(self, canvas, options):
+        return canvas.create_rectangle(*self._coords(canvas), options)
+
+    def _coords(self, canvas):
         x,y = canvas.toScreen(self.x,self.y)
-        return canvas.create_rectangle(x,y,x+1,y+1,options)
+        return [x,y,x+1,y+1]
         
     def _move(self, dx, dy):
         self.x = self.x + dx
@@ -567,20 +1167,24 @@ class Point(GraphicsObject):
         
     def clone(self):
         other = Point(self.x,self.y)
-        other.config = self.config.copy()
+        other.config = self.config
         return other
                 
     def getX(self): return self.x
     def getY(self): return self.y
 
+_POINT_STYLE = Style.of(["outline", "fill"])
+
 class _BBox(GraphicsObject):
     # Internal base class for objects represented by bounding box
     # (opposite corners) Line segment is a degenerate case.
+
+    __slots__ = ("p1", "p2")
     
     def __init__(self, p1, p2, options=["outline","width","fill"]):
         GraphicsObject.__init__(self, options)
-        self.p1 = p1.clone()
-        self.p2 = p2.clone()
+        self.p1 = _Coord(p1.x, p1.y)
+        self.p2 = _Coord(p2.x, p2.y)
 
     def _move(self, dx, dy):
         self.p1.x = self.p1.x + dx
@@ -588,9 +1192,23 @@ class _BBox(GraphicsObject):
         self.p2.x = self.p2.x + dx
         self.p2.y = self.p2.y  + dy
                 
-    def getP1(self): return self.p1.clone()
+    def _coords(self, canvas):
+        p1 = self.p1
+        p2 = self.p2
+        x1,y1 = canvas.toScreen(p1.x,p1.y)
+        x2,y2 = canvas.toScreen(p2.x,p2.y)
+        return [x1,y1,x2,y2]
 
-    def getP2(self): return self.p2.clone()
+    def setPoints(self, p1, p2):
+        """Move the corners to p1 and p2; a drawn object is changed in
+        place"""
+        self.p1 = _Coord(p1.x, p1.y)
+        self.p2 = _Coord(p2.x, p2.y)
+        self._updateCoords()
+
+    def getP1(self): return self.p1.point()
+
+    def getP2(self): return self.p2.point()
     
     def getCenter(self):
         p1 = self.p1
@@ -599,52 +1217,50 @@ class _BBox(GraphicsObject):
 
     
 class Rectangle(_BBox):
+
+    __slots__ = ()
     
     def __init__(self, p1, p2):
         _BBox.__init__(self, p1, p2)
 
     def __repr__(self):
-        return "Rectangle({}, {})".format(str(self.p1), str(self.p2))
+        return "Rectangle({}, {})".format(self.getP1(), self.getP2())
     
     def _draw(self, canvas, options):
-        p1 = self.p1
-        p2 = self.p2
-        x1,y1 = canvas.toScreen(p1.x,p1.y)
-        x2,y2 = canvas.toScreen(p2.x,p2.y)
-        return canvas.create_rectangle(x1,y1,x2,y2,options)
+        return canvas.create_rectangle(*self._coords(canvas), options)
         
     def clone(self):
         other = Rectangle(self.p1, self.p2)
-        other.config = self.config.copy()
+        other.config = self.config
         return other
 
 
 class Oval(_BBox):
+
+    __slots__ = ()
     
     def __init__(self, p1, p2):
         _BBox.__init__(self, p1, p2)
 
     def __repr__(self):
-        return "Oval({}, {})".format(str(self.p1), str(self.p2))
+        return "Oval({}, {})".format(self.getP1(), self.getP2())
 
         
     def clone(self):
         other = Oval(self.p1, self.p2)
-        other.config = self.config.copy()
+        other.config = self.config
         return other
    
     def _draw(self, canvas, options):
-        p1 = self.p1
-        p2 = self.p2
-        x1,y1 = canvas.toScreen(p1.x,p1.y)
-        x2,y2 = canvas.toScreen(p2.x,p2.y)
-        return canvas.create_oval(x1,y1,x2,y2,options)
+        return canvas.create_oval(*self._coords(canvas), options)
     
 class Circle(Oval):
+
+    __slots__ = ("radius",)
     
     def __init__(self, center, radius):
-        p1 = Point(center.x-radius, center.y-radius)
-        p2 = Point(center.x+radius, center.y+radius)
+        p1 = _Coord(center.x-radius, center.y-radius)
+        p2 = _Coord(center.x+radius, center.y+radius)
         Oval.__init__(self, p1, p2)
         self.radius = radius
 
@@ -653,34 +1269,37 @@ class Circle(Oval):
         
     def clone(self):
         other = Circle(self.getCenter(), self.radius)
-        other.config = self.config.copy()
+        other.config = self.config
         return other
         
     def getRadius(self):
         return self.radius
 
+    def setPoints(self, p1, p2):
+        Oval.setPoints(self, p1, p2)
+        self.radius = abs(p2.x - p1.x) / 2.0
+
                   
 class Line(_BBox):
+
+    __slots__ = ()
     
     def __init__(self, p1, p2):
         _BBox.__init__(self, p1, p2, ["arrow","fill","width"])
         self.setFill(DEFAULT_CONFIG['outline'])
-        self.setOutline = self.setFill
+
+    setOutline = GraphicsObject.setFill
 
     def __repr__(self):
-        return "Line({}, {})".format(str(self.p1), str(self.p2))
+        return "Line({}, {})".format(self.getP1(), self.getP2())
 
     def clone(self):
         other = Line(self.p1, self.p2)
-        other.config = self.config.copy()
+        other.config = self.config
         return other
   
     def _draw(self, canvas, options):
-        p1 = self.p1
-        p2 = self.p2
-        x1,y1 = canvas.toScreen(p1.x,p1.y)
-        x2,y2 = canvas.toScreen(p2.x,p2.y)
-        return canvas.create_line(x1,y1,x2,y2,options)
+        return canvas.create_line(*self._coords(canvas), options)
         
     def setArrow(self, option):
         if not option in ["first","last","both","none"]:
@@ -688,62 +1307,144 @@ class Line(_BBox):
         self._reconfig("arrow", option)
         
 
+def _flatXY(points):
+    # The coordinates of a sequence of Points as a flat array('d')
+    if len(points) == 1 and type(points[0]) == type([]):
+        points = points[0]
+    xy = array('d')
+    for p in points:
+        xy.append(p.x)
+        xy.append(p.y)
+    return xy
+
+
+def _toXY(xy):
+    # A flat sequence of coordinates as a new array('d'); NumPy arrays
+    # and arrays are copied in bulk
+    np = _numpy()
+    if np is not None and not isinstance(xy, (list, tuple)):
+        return array('d', np.ascontiguousarray(xy, dtype=float).ravel().tobytes())
+    return array('d', xy)
+
+
 class Polygon(GraphicsObject):
+
+    # The vertices are kept in xy, one flat array('d') of
+    # x0,y0,x1,y1,... rather than as Points, so a shape with many
+    # thousands of them is cheap to build, move and draw
+    __slots__ = ("xy",)
     
     def __init__(self, *points):
         # if points passed as a list, extract it
-        if len(points) == 1 and type(points[0]) == type([]):
-            points = points[0]
-        self.points = list(map(Point.clone, points))
+        self.xy = _flatXY(points)
         GraphicsObject.__init__(self, ["outline", "width", "fill"])
 
+    @classmethod
+    def fromXY(cls, xy):
+        """Make one from a flat sequence of coordinates x0,y0,x1,y1,...,
+        such as an array('d') or a NumPy array"""
+        other = cls()
+        other.xy = _toXY(xy)
+        return other
+
     def __repr__(self):
-        return "Polygon"+str(tuple(p for p in self.points))
+        return type(self).__name__+str(tuple(self.points))
         
     def clone(self):
-        other = Polygon(*self.points)
-        other.config = self.config.copy()
+        other = self.fromXY(self.xy)
+        other.config = self.config
         return other
 
+    @property
+    def points(self):
+        xy = self.xy
+        return [Point(xy[i], xy[i+1]) for i in range(0, len(xy), 2)]
+
     def getPoints(self):
-        return list(map(Point.clone, self.points))
+        return self.points
+
+    def setPoints(self, points):
+        """Replace the vertices; a drawn polygon is changed in place"""
+        self.xy = _flatXY(points)
+        self._updateCoords()
+
+    def getXY(self):
+        """Returns a copy of the vertices as a flat array('d')"""
+        return array('d', self.xy)
+
+    def setXY(self, xy):
+        """Replace the vertices with a flat sequence x0,y0,x1,y1,...;
+        a drawn polygon is changed in place"""
+        self.xy = _toXY(xy)
+        self._updateCoords()
 
     def _move(self, dx, dy):
-        for p in self.points:
-            p.move(dx,dy)
+        xy = self.xy
+        np = _numpy()
+        if np is not None:
+            view = np.frombuffer(xy, dtype=float)
+            view[0::2] += dx
+            view[1::2] += dy
+        else:
+            xy[0::2] = array('d', [x+dx for x in xy[0::2]])
+            xy[1::2] = array('d', [y+dy for y in xy[1::2]])
    
     def _draw(self, canvas, options):
-        args = [canvas]
-        for p in self.points:
-            x,y = canvas.toScreen(p.x,p.y)
-            args.append(x)
-            args.append(y)
-        args.append(options)
-        return GraphWin.create_polygon(*args) 
+        return canvas.create_polygon(self._coords(canvas), options)
+
+    def _coords(self, canvas):
+        return canvas.toScreenFlat(self.xy)
+
+
+class Polyline(Polygon):
+
+    """An open path through its vertices, drawn as one Tk line; like
+    a Line it has a fill color (no outline) and arrows"""
+
+    __slots__ = ()
+
+    def __init__(self, *points):
+        self.xy = _flatXY(points)
+        GraphicsObject.__init__(self, ["arrow","fill","width"])
+        self.setFill(DEFAULT_CONFIG['outline'])
+
+    setOutline = GraphicsObject.setFill
+
+    def _draw(self, canvas, options):
+        return canvas.create_line(self._coords(canvas), options)
+
+    setArrow = Line.setArrow
 
 class Text(GraphicsObject):
+
+    __slots__ = ("anchor",)
     
     def __init__(self, p, text):
         GraphicsObject.__init__(self, ["justify","fill","text","font"])
         self.setText(text)
-        self.anchor = p.clone()
+        self.anchor = _Coord(p.x, p.y)
         self.setFill(DEFAULT_CONFIG['outline'])
-        self.setOutline = self.setFill
+
+    setOutline = GraphicsObject.setFill
 
     def __repr__(self):
-        return "Text({}, '{}')".format(self.anchor, self.getText())
+        return "Text({}, '{}')".format(self.getAnchor(), self.getText())
     
     def _draw(self, canvas, options):
+        return canvas.create_text(*self._coords(canvas), options)
+
+    def _coords(self, canvas):
         p = self.anchor
-        x,y = canvas.toScreen(p.x,p.y)
-        return canvas.create_text(x,y,options)
+        return list(canvas.toScreen(p.x,p.y))
         
     def _move(self, dx, dy):
-        self.anchor.move(dx,dy)
+        anchor = self.anchor
+        anchor.x = anchor.x + dx
+        anchor.y = anchor.y + dy
         
     def clone(self):
         other = Text(self.anchor, self.config['text'])
-        other.config = self.config.copy()
+        other.config = self.config
         return other
 
     def setText(self,text):
@@ -753,7 +1454,12 @@ class Text(GraphicsObject):
         return self.config["text"]
             
     def getAnchor(self):
-        return self.anchor.clone()
+        return self.anchor.point()
+
+    def setAnchor(self, p):
+        """Move the anchor to p; a drawn object is changed in place"""
+        self.anchor = _Coord(p.x, p.y)
+        self._updateCoords()
 
     def setFace(self, face):
         if face in ['helvetica','arial','courier','times roman']:
@@ -782,12 +1488,16 @@ class Text(GraphicsObject):
 
 class Entry(GraphicsObject):
 
+    __slots__ = ("anchor", "width", "text", "fill", "color", "font", "entry")
+
+    _pooled = False     # its window item holds a Tk entry widget
+
     def __init__(self, p: object, width: object) -> object:
         GraphicsObject.__init__(self, [])
-        self.anchor = p.clone()
+        self.anchor = _Coord(p.x, p.y)
         #print self.anchor
         self.width = width
-        self.text = tk.StringVar(_root)
+        self.text = tk.StringVar(_getRoot())
         self.text.set("")
         self.fill = "gray"
         self.color = "black"
@@ -795,7 +1505,7 @@ class Entry(GraphicsObject):
         self.entry = None
 
     def __repr__(self):
-        return "Entry({}, {})".format(self.anchor, self.width)
+        return "Entry({}, {})".format(self.getAnchor(), self.width)
 
     def _draw(self, canvas, options):
         p = self.anchor
@@ -816,14 +1526,20 @@ class Entry(GraphicsObject):
         return self.text.get()
 
     def _move(self, dx, dy):
-        self.anchor.move(dx,dy)
+        anchor = self.anchor
+        anchor.x = anchor.x + dx
+        anchor.y = anchor.y + dy
+
+    def _coords(self, canvas):
+        p = self.anchor
+        return list(canvas.toScreen(p.x,p.y))
 
     def getAnchor(self):
-        return self.anchor.clone()
+        return self.anchor.point()
 
     def clone(self):
         other = Entry(self.anchor, self.width)
-        other.config = self.config.copy()
+        other.config = self.config
         other.text = tk.StringVar()
         other.text.set(self.text.get())
         other.fill = self.fill
@@ -871,33 +1587,274 @@ class Entry(GraphicsObject):
             self.entry.config(fg=color)
 
 
+class PhotoCache:
+
+    """Decoded image files, shared by every Image that shows them.
+
+    Each file is read and decoded once. Images hold a reference to the
+    file's picture while they use it; when more than maxsize files are
+    cached, the least recently used ones that no Image holds are
+    dropped. hits and misses count lookups."""
+
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._photos = OrderedDict()    # path -> tk PhotoImage
+        self._refs = {}                 # path -> number of holders
+
+    def __len__(self):
+        return len(self._photos)
+
+    def _key(self, filename):
+        return os.path.abspath(filename)
+
+    def get(self, filename):
+        """Returns the decoded picture for filename without holding it"""
+        key = self._key(filename)
+        photo = self._photos.get(key)
+        if photo is None:
+            self.misses += 1
+            photo = self._photos[key] = tk.PhotoImage(file=filename, master=_getRoot())
+            self._refs[key] = 0
+            self._trim(keep=key)
+        else:
+            self.hits += 1
+            self._photos.move_to_end(key)
+        return photo
+
+    def acquire(self, filename):
+        """Returns the picture for filename, held until release()"""
+        photo = self.get(filename)
+        self._refs[self._key(filename)] += 1
+        return photo
+
+    def release(self, filename):
+        key = self._key(filename)
+        if self._refs.get(key):
+            self._refs[key] -= 1
+            self._trim()
+
+    def preload(self, filenames):
+        """Decodes every file in filenames that is not cached yet"""
+        for filename in filenames:
+            self.get(filename)
+
+    def _trim(self, keep=None):
+        # Drop unheld pictures other than keep, oldest first, until
+        # within maxsize
+        if len(self._photos) <= self.maxsize:
+            return
+        for key in [k for k in self._photos if not self._refs[k] and k != keep]:
+            del self._photos[key]
+            del self._refs[key]
+            if len(self._photos) <= self.maxsize:
+                break
+
+    def clear(self):
+        """Forgets every picture that no Image holds"""
+        for key in [k for k in self._photos if not self._refs[k]]:
+            del self._photos[key]
+            del self._refs[key]
+
+
+_photoCache = PhotoCache()
+
+def getPhotoCache():
+    """Returns the cache that Images load their files through"""
+    return _photoCache
+
+def preloadImages(filenames):
+    """Reads and decodes the image files in filenames ahead of use, so
+    that Images made from them later do not touch the disk"""
+    _photoCache.preload(filenames)
+
+
+class Atlas:
+
+    """A sprite sheet: one image file holding columns x rows equal cells,
+    numbered left to right and top to bottom. region(k) gives cell k as
+    a picture an Image can show (see Image.setRegion).
+
+    Tk cannot draw part of a picture, so each cell is cut out of the
+    sheet the first time it is asked for and kept. preload() cuts every
+    cell and lets go of the sheet.
+
+    files optionally names a separate picture file for each cell. If
+    the sheet file does not exist the cells are read from those instead,
+    and save() can write the sheet out."""
+
+    def __init__(self, filename, columns, rows, files=None):
+        self.filename = filename
+        self.columns = columns
+        self.rows = rows
+        self.files = None
+        if files is not None and not os.path.exists(filename):
+            self.files = list(files)
+        self.cellWidth = self.cellHeight = None     # known once loaded
+        self._sheet = None
+        self._regions = {}
+
+    def _getSheet(self):
+        if self._sheet is None:
+            self._sheet = _photoCache.acquire(self.filename)
+            self.cellWidth = self._sheet.width() // self.columns
+            self.cellHeight = self._sheet.height() // self.rows
+        return self._sheet
+
+    def __len__(self):
+        if self.files is not None:
+            return len(self.files)
+        return self.columns * self.rows
+
+    def region(self, k):
+        """Returns cell k as a tk PhotoImage"""
+        photo = self._regions.get(k)
+        if photo is None:
+            if not 0 <= k < len(self):
+                raise GraphicsError(BAD_OPTION)
+            if self.files is not None:
+                photo = self._regions[k] = _photoCache.acquire(self.files[k])
+                self.cellWidth, self.cellHeight = photo.width(), photo.height()
+                return photo
+            sheet = self._getSheet()
+            w, h = self.cellWidth, self.cellHeight
+            x, y = k % self.columns * w, k // self.columns * h
+            photo = tk.PhotoImage(master=_getRoot(), width=w, height=h)
+            photo.tk.call(photo.name, "copy", sheet.name,
+                          "-from", x, y, x + w, y + h, "-to", 0, 0)
+            self._regions[k] = photo
+        return photo
+
+    def preload(self):
+        """Cuts out every cell, then releases the sheet"""
+        if self.files is not None:
+            preloadImages(self.files)
+        for k in range(len(self)):
+            self.region(k)
+        if self._sheet is not None:
+            self._sheet = None
+            _photoCache.release(self.filename)
+
+    def save(self, filename=None):
+        """Writes the cells out as one sheet, by default to the sheet
+        file; the format comes from the file name extension"""
+        filename = filename or self.filename
+        first = self.region(0)
+        w, h = first.width(), first.height()
+        sheet = tk.PhotoImage(master=_getRoot(), width=w * self.columns,
+                              height=h * self.rows)
+        for k in range(len(self)):
+            x, y = k % self.columns * w, k // self.columns * h
+            sheet.tk.call(sheet.name, "copy", self.region(k).name, "-to", x, y)
+        sheet.write(filename, format=filename.split(".")[-1])
+
+
 class Image(GraphicsObject):
 
+    __slots__ = ("anchor", "imageId", "filename", "region", "size", "_img")
+
     idCount = 0
     imageCache = {} # tk photoimages go here to avoid GC while drawn 
     
     def __init__(self, p, *pixmap):
         GraphicsObject.__init__(self, [])
-        self.anchor = p.clone()
+        self.anchor = _Coord(p.x, p.y)
         self.imageId = Image.idCount
         Image.idCount = Image.idCount + 1
+        # The picture is one of: a shared file picture, an atlas cell
+        # or a blank one of the given size. The tk PhotoImage for it is
+        # only made when first needed (so not at all offscreen).
+        self.filename = None
+        self.region = None      # (atlas, k)
+        self.size = None        # (width, height)
+        self._img = None
         if len(pixmap) == 1: # file name provided
-            self.img = tk.PhotoImage(file=pixmap[0], master=_root)
+            self.filename = pixmap[0]
+        elif isinstance(pixmap[0], Atlas): # atlas and cell provided
+            self.region = tuple(pixmap)
         else: # width and height provided
-            width, height = pixmap
-            self.img = tk.PhotoImage(master=_root, width=width, height=height)
+            self.size = tuple(pixmap)
+
+    @property
+    def img(self):
+        if self._img is None:
+            if isinstance(self.canvas, OffscreenWin):
+                # No Tk here: the window's Pillow picture, in the same
+                # wrapper its raster layer uses
+                self._img = _PixelLayer.of(self.canvas._imageFor(self))
+            elif self.filename is not None:
+                self._img = _photoCache.acquire(self.filename)
+            elif self.region is not None:
+                atlas, k = self.region
+                self._img = atlas.region(k)
+            else:
+                width, height = self.size
+                self._img = tk.PhotoImage(master=_getRoot(), width=width, height=height)
+        return self._img
+
+    @img.setter
+    def img(self, img):
+        self._show(img=img)
+
+    def __del__(self):
+        if getattr(self, "_img", None) is not None and self.filename is not None \
+           and _photoCache is not None and not isinstance(self._img, _PixelLayer):
+            _photoCache.release(self.filename)
+
+    def _own(self):
+        # Copy a shared picture before changing its pixels
+        if self.filename is not None or self.region is not None:
+            self._show(img=self.img.copy())
+
+    def _show(self, filename=None, region=None, img=None):
+        # Switch to another picture; a drawn image is changed in place
+        if self._img is not None and self.filename is not None \
+           and not isinstance(self._img, _PixelLayer):
+            _photoCache.release(self.filename)
+        self.filename = filename
+        self.region = region
+        self.size = None
+        self._img = img
+        if self.canvas and not self.canvas.isClosed():
+            self.canvas.itemconfig(self.id, image=self.canvas._imageFor(self))
+            self.canvas._autoflush()
+
+    def setImage(self, filename):
+        """Shows the picture in filename instead, keeping the anchor"""
+        self._show(filename=filename)
+
+    def setRegion(self, atlas, k):
+        """Shows cell k of atlas instead, keeping the anchor"""
+        self._show(region=(atlas, k))
+
+    def getRegion(self):
+        """Returns the atlas cell shown, or None if not showing one"""
+        return self.region[1] if self.region else None
+
+    def getImage(self):
+        """Returns the file name of the picture shown, or None if the
+        picture was not loaded from a file (or has been changed)"""
+        return self.filename
 
     def __repr__(self):
-        return "Image({}, {}, {})".format(self.anchor, self.getWidth(), self.getHeight())
+        return "Image({}, {}, {})".format(self.getAnchor(), self.getWidth(), self.getHeight())
                 
     def _draw(self, canvas, options):
-        p = self.anchor
-        x,y = canvas.toScreen(p.x,p.y)
-        self.imageCache[self.imageId] = self.img # save a reference  
-        return canvas.create_image(x,y,image=self.img)
+        x,y = self._coords(canvas)
+        return canvas.create_image(x,y,image=canvas._imageFor(self))
+
+    def _itemOptions(self, canvas):
+        return {"image": canvas._imageFor(self)}
     
     def _move(self, dx, dy):
-        self.anchor.move(dx,dy)
+        anchor = self.anchor
+        anchor.x = anchor.x + dx
+        anchor.y = anchor.y + dy
+
+    def _coords(self, canvas):
+        p = self.anchor
+        return list(canvas.toScreen(p.x,p.y))
         
     def undraw(self):
         try:
@@ -907,13 +1864,23 @@ class Image(GraphicsObject):
         GraphicsObject.undraw(self)
 
     def getAnchor(self):
-        return self.anchor.clone()
+        return self.anchor.point()
+
+    def setAnchor(self, p):
+        """Move the anchor to p; a drawn object is changed in place"""
+        self.anchor = _Coord(p.x, p.y)
+        self._updateCoords()
         
     def clone(self):
-        other = Image(Point(0,0), 0, 0)
-        other.img = self.img.copy()
-        other.anchor = self.anchor.clone()
-        other.config = self.config.copy()
+        if self.filename is not None:
+            other = Image(Point(0,0), self.filename)
+        elif self.region is not None:
+            other = Image(Point(0,0), *self.region)
+        else:
+            other = Image(Point(0,0), 0, 0)
+            other.img = self.img.copy()
+        other.anchor = _Coord(self.anchor.x, self.anchor.y)
+        other.config = self.config
         return other
 
     def getWidth(self):
@@ -942,7 +1909,55 @@ class Image(GraphicsObject):
         """Sets pixel (x,y) to the given color
         
         """
+        self._own()
         self.img.put("{" + color +"}", (x, y))
+
+    def to_array(self):
+        """Returns the whole image as a NumPy array of shape
+        (height, width, 3) and dtype uint8, read in one call"""
+        np = _numpy()
+        if np is None:
+            raise ImportError("to_array requires numpy")
+        if isinstance(self.img, _PixelLayer):
+            return np.asarray(self.img.picture.convert("RGB")).copy()
+        width, height = self.getWidth(), self.getHeight()
+        # Tk gives the pixels as a list of rows of "#rrggbb" colors
+        rows = self.img.tk.splitlist(self.img.tk.call(self.img.name, "data"))
+        text = " ".join(row if isinstance(row, str) else " ".join(row) for row in rows)
+        data = bytes.fromhex(text.replace("#", "").replace(" ", ""))
+        return np.frombuffer(data, dtype=np.uint8).reshape(height, width, 3).copy()
+
+    @classmethod
+    def from_array(cls, p, array):
+        """Returns a new Image anchored at p holding the pixels of an
+        (height, width, 3) array of RGB values in range(256)"""
+        height, width = len(array), len(array[0])
+        image = cls(p, width, height)
+        image.put_rows(0, 0, array)
+        return image
+
+    def put_rows(self, x, y, array):
+        """Copies an (h, w, 3) array of RGB values into the image with
+        its top left corner at pixel (x,y)"""
+        np = _numpy()
+        if np is None:
+            raise ImportError("put_rows requires numpy")
+        self._own()
+        array = np.ascontiguousarray(array, dtype=np.uint8)
+        if isinstance(self.img, _PixelLayer):
+            picture = _pillow()[0].fromarray(array[:, :, :3], "RGB")
+            self.img.picture.paste(picture.convert("RGBA"), (x, y))
+            return
+        height, width = array.shape[:2]
+        # As a binary PPM the block goes to Tk in one piece
+        header = "P6 {} {} 255\n".format(width, height).encode("ascii")
+        try:
+            self.img.tk.call(self.img.name, "put", header + array.tobytes(),
+                             "-format", "ppm", "-to", x, y)
+        except tk.TclError:  # a Tk that only reads PPM from files
+            names = _colorNames(array.reshape(-1, 3), width * height)
+            rows = [tuple(names[i:i + width]) for i in range(0, len(names), width)]
+            self.img.put(tuple(rows), to=(x, y))
         
 
     def save(self, filename):
@@ -955,6 +1970,505 @@ class Image(GraphicsObject):
         ext = name.split(".")[-1]
         self.img.write( filename, format=ext)
 
+
+
+class Group(GraphicsObject):
+
+    """Objects that are drawn, undrawn, moved and recolored together.
+    Once drawn, the members' Tk items share a tag, so each of those
+    operations is a single canvas call however many members there are.
+    Undrawing a group hides its items, and drawing it again in the same
+    window shows them; members may be Groups themselves."""
+
+    __slots__ = ("tag", "fillTag", "objects", "hiddenIn", "parent")
+
+    _count = 0
+
+    def __init__(self, *objects):
+        GraphicsObject.__init__(self, [])
+        Group._count += 1
+        self.tag = "group{}".format(Group._count)
+        self.fillTag = self.tag + ".fill"   # members that have a fill
+        self.objects = []
+        self.hiddenIn = None    # window holding the hidden items
+        self.parent = None      # the Group this one was added to
+        for obj in objects:
+            self.add(obj)
+
+    def __repr__(self):
+        return "Group({})".format(", ".join(map(repr, self.objects)))
+
+    def add(self, obj):
+        """Add obj to the group, drawing it if the group is drawn"""
+        self.objects.append(obj)
+        if isinstance(obj, Group):
+            obj.parent = self
+        canvas = self.canvas
+        if canvas and not canvas.isClosed():
+            self._join(obj, canvas)
+            # An enclosing group may be undrawn while this one is not
+            if any(group.hiddenIn is canvas for group in self._lineage()):
+                canvas.itemconfig(obj.id, state="hidden")
+            canvas._autoflush()
+
+    def remove(self, obj):
+        """Take obj out of the group; it stays drawn if the group is"""
+        self.objects.remove(obj)
+        if isinstance(obj, Group):
+            obj.parent = None
+        canvas = obj.canvas
+        if canvas and not canvas.isClosed():
+            lineage = list(self._lineage())
+            for group in lineage:
+                canvas.dtag(obj.id, group.tag)
+                canvas.dtag(obj.id, group.fillTag)
+            if any(group.hiddenIn is canvas for group in lineage):
+                obj.undraw()
+
+    def getObjects(self):
+        return list(self.objects)
+
+    def _lineage(self):
+        # This group and the groups enclosing it, innermost first
+        group = self
+        while group is not None:
+            yield group
+            group = group.parent
+
+    def _join(self, obj, canvas):
+        # Draw obj in canvas if need be and tag its items for this group
+        # and every group enclosing it, so that moving, recoloring or
+        # undrawing any of them reaches obj even when it joins late
+        if obj.canvas is not canvas:
+            obj.draw(canvas)
+        for group in self._lineage():
+            canvas.addtag_withtag(group.tag, obj.id)
+            if isinstance(obj, Group):
+                canvas.addtag_withtag(group.fillTag, obj.fillTag)
+            elif "fill" in obj.config:
+                canvas.addtag_withtag(group.fillTag, obj.id)
+
+    def draw(self, graphwin):
+        if self.canvas and not self.canvas.isClosed(): raise GraphicsError(OBJ_ALREADY_DRAWN)
+        if graphwin.isClosed(): raise GraphicsError("Can't draw to closed window")
+        if self.hiddenIn is not graphwin:
+            self._release()
+        with graphwin.batch():
+            # Members undrawn on their own since the group was hidden
+            # are drawn again; the rest are already there
+            for obj in self.objects:
+                if obj.canvas is not graphwin:
+                    self._join(obj, graphwin)
+            graphwin.itemconfig(self.tag, state="normal")
+            graphwin.tag_raise(self.tag)
+        self.hiddenIn = None
+        self.canvas = graphwin
+        self.id = self.tag
+        return self
+
+    def undraw(self):
+        if not self.canvas: return
+        if not self.canvas.isClosed():
+            self.canvas.itemconfig(self.tag, state="hidden")
+            self.hiddenIn = self.canvas
+            self.canvas._autoflush()
+        self.canvas = None
+        self.id = None
+
+    def _release(self):
+        # Undraw the members left hidden by undraw, for good
+        if self.hiddenIn is not None:
+            for obj in self.objects:
+                obj.undraw()
+                if isinstance(obj, Group):
+                    obj._release()
+            self.hiddenIn = None
+
+    def move(self, dx, dy):
+        self._move(dx, dy)
+        canvas = self.canvas or self.hiddenIn
+        if canvas and not canvas.isClosed():
+            trans = canvas.trans
+            if trans:
+                dx, dy = dx / trans.xscale, -dy / trans.yscale
+            canvas.move(self.tag, dx, dy)
+            canvas._autoflush()
+
+    def _move(self, dx, dy):
+        for obj in self.objects:
+            obj._move(dx, dy)
+
+    def setFill(self, color):
+        """Set the fill color of every member that has one"""
+        self._setFill(color)
+        canvas = self.canvas or self.hiddenIn
+        if canvas and not canvas.isClosed():
+            canvas.itemconfig(self.fillTag, fill=color)
+            canvas._autoflush()
+
+    def _setFill(self, color):
+        for obj in self.objects:
+            if isinstance(obj, Group):
+                obj._setFill(color)
+            elif "fill" in obj.config:
+                obj.config = obj.config.replace("fill", color)
+
+    def setOutline(self, color):
+        raise GraphicsError(UNSUPPORTED_METHOD)
+
+    def setWidth(self, width):
+        raise GraphicsError(UNSUPPORTED_METHOD)
+
+    def clone(self):
+        return Group(*(obj.clone() for obj in self.objects))
+
+
+class _PixelLayer:
+
+    # A stand-in for a tk PhotoImage, as far as _putPixels and Image
+    # use one, backed by a Pillow image (transparent when new)
+
+    def __init__(self, width, height):
+        Picture, ImageColor, _, _ = _pillow()
+        self.picture = Picture.new("RGBA", (width, height), (0, 0, 0, 0))
+        self._rgba = {}
+
+    @classmethod
+    def of(cls, picture):
+        layer = cls.__new__(cls)
+        layer.picture = picture
+        layer._rgba = {}
+        return layer
+
+    def width(self):
+        return self.picture.width
+
+    def height(self):
+        return self.picture.height
+
+    def get(self, x, y):
+        return self.picture.getpixel((x, y))[:3]
+
+    def copy(self):
+        return _PixelLayer.of(self.picture.copy())
+
+    def write(self, filename, format=None):
+        picture = self.picture
+        if format not in ("png", "gif"):
+            picture = picture.convert("RGB")
+        picture.save(filename)
+
+    def put(self, rows, to=(0, 0)):
+        if isinstance(rows, str):       # one color, as setPixel gives it
+            rows = ((rows.strip("{}"),),)
+        x, y = to
+        rgba = self._rgba
+        pixels = self.picture.load()
+        for j, row in enumerate(rows):
+            for i, color in enumerate(row):
+                if color not in rgba:
+                    rgba[color] = _rgb(color) + (255,)
+                pixels[x + i, y + j] = rgba[color]
+
+    def blank(self):
+        self.picture.paste((0, 0, 0, 0), (0, 0) + self.picture.size)
+
+
+def _tagsOf(options):
+    # The tags option of an offscreen item, as a tuple
+    tags = options.get("tags", ())
+    return tuple(tags.split()) if isinstance(tags, str) else tuple(tags)
+
+
+def _rgb(color):
+    # (r, g, b) for a Tk color name
+    try:
+        return _pillow()[1].getrgb(color)[:3]
+    except ValueError:
+        raise GraphicsError(BAD_OPTION) from None
+
+
+class OffscreenWin(GraphWin):
+
+    """A GraphWin that draws into memory instead of onto the screen.
+    Make one with GraphWin(..., backend="offscreen") or directly. It
+    needs no Tk and no display, but does need Pillow.
+
+    Everything drawn is kept in a display list, and getFrame() renders
+    it as a Pillow image; save() writes that to a PNG, PPM or any other
+    file Pillow can write. Images show files and atlas cells read with
+    Pillow. Entry boxes and line arrows are not supported. Nobody can
+    click, so getMouse and getKey only return what click() and press()
+    have queued, and raise GraphicsError when there is nothing."""
+
+    background = "#d9d9d9"      # Tk's default canvas color
+
+    def __init__(self, title="Graphics Window",
+                 width=200, height=200, autoflush=True, backend="offscreen"):
+        assert type(title) == type(""), "Title must be a string"
+        _pillow()
+        self.title = title
+        self._initState(width, height, autoflush)
+        self._display = {}      # id -> [kind, coords, options], in drawing order
+        self._lastId = 0
+        self._pictures = {}     # file name -> Pillow image
+
+    def __repr__(self):
+        if self.isClosed():
+            return "<Closed GraphWin>"
+        else:
+            return "OffscreenWin('{}', {}, {})".format(self.title, self.width,
+                                                     self.height)
+
+    def close(self):
+        """Close the window"""
+        self.closed = True
+
+    def setBackground(self, color):
+        """Set background color of the window"""
+        if self.closed:
+            raise GraphicsError("window is closed")
+        self.background = color
+
+    def update(self):
+        pass
+
+    def update_idletasks(self):
+        pass
+
+    def _autoflush(self):
+        pass
+
+    def _inputArrived(self):
+        pass
+
+    def _waitInput(self):
+        raise GraphicsError("no input waiting in offscreen window")
+
+    def waitForClose(self):
+        pass
+
+    def click(self, x, y):
+        """Queue a click at (x,y) in window coordinates"""
+        event = tk.Event()
+        event.x, event.y = self.toScreen(x, y)
+        self._onClick(event)
+
+    def press(self, key):
+        """Queue a key press of the key named key, as in getKey"""
+        event = tk.Event()
+        event.keysym = key
+        self._onKey(event)
+
+    def getRaster(self):
+        if self._raster is None:
+            self._raster = _PixelLayer(self.width, self.height)
+            self.create_image(0, 0, image=self._raster, anchor="nw")
+        return self._raster
+
+    # The parts of the tk.Canvas interface that GraphicsObjects use
+
+    def _create(self, kind, args, kw):
+        coords = list(args)
+        options = {}
+        if coords and isinstance(coords[-1], dict):
+            options.update(coords.pop())
+        options.update(kw)
+        if len(coords) == 1:            # a list of coordinates
+            coords = list(coords[0])
+        self._lastId += 1
+        self._display[self._lastId] = [kind, coords, options]
+        return self._lastId
+
+    def create_rectangle(self, *args, **kw):
+        return self._create("rectangle", args, kw)
+
+    def create_oval(self, *args, **kw):
+        return self._create("oval", args, kw)
+
+    def create_line(self, *args, **kw):
+        return self._create("line", args, kw)
+
+    def create_polygon(self, *args, **kw):
+        return self._create("polygon", args, kw)
+
+    def create_text(self, *args, **kw):
+        return self._create("text", args, kw)
+
+    def create_image(self, *args, **kw):
+        return self._create("image", args, kw)
+
+    def create_window(self, *args, **kw):
+        raise GraphicsError(UNSUPPORTED_METHOD)
+
+    def _ids(self, tagOrId):
+        if tagOrId == "all":
+            return list(self._display)
+        if tagOrId in self._display:
+            return [tagOrId]
+        return [i for i, (kind, coords, options) in self._display.items()
+                if tagOrId in _tagsOf(options)]
+
+    def addtag_withtag(self, newtag, tagOrId):
+        for i in self._ids(tagOrId):
+            options = self._display[i][2]
+            tags = _tagsOf(options)
+            if newtag not in tags:
+                options["tags"] = tags + (newtag,)
+
+    def dtag(self, tagOrId, tagToDelete=None):
+        if tagToDelete is None:
+            tagToDelete = tagOrId
+        for i in self._ids(tagOrId):
+            options = self._display[i][2]
+            options["tags"] = tuple(t for t in _tagsOf(options) if t != tagToDelete)
+
+    def delete(self, tagOrId):
+        for i in self._ids(tagOrId):
+            del self._display[i]
+
+    def move(self, tagOrId, dx, dy):
+        for i in self._ids(tagOrId):
+            coords = self._display[i][1]
+            coords[0::2] = [x + dx for x in coords[0::2]]
+            coords[1::2] = [y + dy for y in coords[1::2]]
+
+    def coords(self, tagOrId, *coords):
+        ids = self._ids(tagOrId)
+        if coords:
+            if len(coords) == 1:
+                coords = coords[0]
+            for i in ids:
+                self._display[i][1] = list(coords)
+        return list(self._display[ids[0]][1]) if ids else []
+
+    def tag_raise(self, tagOrId):
+        for i in self._ids(tagOrId):
+            self._display[i] = self._display.pop(i)
+
+    def itemconfig(self, tagOrId, cnf=None, **kw):
+        for i in self._ids(tagOrId):
+            options = self._display[i][2]
+            if cnf:
+                options.update(cnf)
+            options.update(kw)
+
+    itemconfigure = itemconfig
+
+    def _picture(self, filename):
+        if filename not in self._pictures:
+            self._pictures[filename] = _pillow()[0].open(filename).convert("RGBA")
+        return self._pictures[filename]
+
+    def _cell(self, atlas, k):
+        if atlas.files is not None:
+            return self._picture(atlas.files[k])
+        key = atlas.filename, k
+        if key not in self._pictures:
+            sheet = self._picture(atlas.filename)
+            w, h = sheet.width // atlas.columns, sheet.height // atlas.rows
+            x, y = k % atlas.columns * w, k // atlas.columns * h
+            self._pictures[key] = sheet.crop((x, y, x + w, y + h))
+        return self._pictures[key]
+
+    def preloadAtlas(self, atlas):
+        for k in range(len(atlas)):
+            self._cell(atlas, k)
+
+    def _imageFor(self, image):
+        # A Pillow picture for an Image
+        Picture = _pillow()[0]
+        if isinstance(image._img, _PixelLayer):
+            return image._img.picture
+        if image.filename is not None:
+            return self._picture(image.filename)
+        if image.region is not None:
+            return self._cell(*image.region)
+        if image.size is not None:
+            # A blank picture belongs to the image, so pixels set later
+            # show
+            image._img = _PixelLayer.of(Picture.new("RGBA", image.size, (0, 0, 0, 0)))
+            return image._img.picture
+        # A picture that already lives in Tk
+        return Picture.fromarray(image.to_array()).convert("RGBA")
+
+    # Rendering
+
+    def getFrame(self):
+        """Returns the window's current contents as a Pillow RGB image"""
+        Picture, _, ImageDraw, _ = _pillow()
+        frame = Picture.new("RGB", (self.width, self.height), _rgb(self.background))
+        draw = ImageDraw.Draw(frame)
+        for kind, coords, options in self._display.values():
+            if options.get("state") == "hidden":
+                continue
+            getattr(self, "_render" + kind.capitalize())(frame, draw, coords, options)
+        return frame
+
+    def save(self, filename):
+        """Saves the window's current contents to filename, in the
+        format given by its extension (.png, .ppm, ...)"""
+        self.getFrame().save(filename)
+
+    @staticmethod
+    def _colors(options, *names):
+        return [_rgb(options[n]) if options.get(n) else None for n in names]
+
+    @staticmethod
+    def _width(options):
+        return max(int(round(float(options.get("width", 1)))), 0)
+
+    @staticmethod
+    def _box(coords):
+        x1, y1, x2, y2 = coords[:4]
+        return [min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2)]
+
+    def _renderRectangle(self, frame, draw, coords, options):
+        fill, outline = self._colors(options, "fill", "outline")
+        draw.rectangle(self._box(coords), fill=fill, outline=outline,
+                       width=self._width(options))
+
+    def _renderOval(self, frame, draw, coords, options):
+        fill, outline = self._colors(options, "fill", "outline")
+        draw.ellipse(self._box(coords), fill=fill, outline=outline,
+                     width=self._width(options))
+
+    def _renderLine(self, frame, draw, coords, options):
+        fill, = self._colors(options, "fill")
+        if fill:
+            draw.line(coords, fill=fill, width=self._width(options))
+
+    def _renderPolygon(self, frame, draw, coords, options):
+        fill, outline = self._colors(options, "fill", "outline")
+        draw.polygon(coords, fill=fill, outline=outline, width=self._width(options))
+
+    _fonts = {}
+
+    def _renderText(self, frame, draw, coords, options):
+        fill, = self._colors(options, "fill")
+        if not fill or not options.get("text"):
+            return
+        size = options.get("font", DEFAULT_CONFIG["font"])[1]
+        font = self._fonts.get(size)
+        if font is None:
+            ImageFont = _pillow()[3]
+            try:
+                font = ImageFont.load_default(size)
+            except TypeError:   # Pillow before 10.1 has one size only
+                font = ImageFont.load_default()
+            self._fonts[size] = font
+        draw.multiline_text(coords[:2], str(options["text"]), fill=fill, font=font,
+                            anchor="mm", align=options.get("justify", "center"))
+
+    def _renderImage(self, frame, draw, coords, options):
+        picture = options["image"]
+        if isinstance(picture, _PixelLayer):
+            picture = picture.picture
+        x, y = coords[:2]
+        if options.get("anchor") != "nw":
+            x, y = x - picture.width // 2, y - picture.height // 2
+        frame.paste(picture, (int(x), int(y)), picture)
+
         
 def color_rgb(r,g,b):
     """r,g,b are intensities of red, green, and blue in range(256)
@@ -1005,11 +2519,144 @@ def test():
     win.getMouse()
     win.close()
 
+def test_offscreen():
+    """Checks drawing, images, hotspots, item reuse and Polylines in an
+    OffscreenWin, that the bulk Transform methods round as screen()
+    does with and without NumPy, and that objects still copy and
+    pickle; needs Pillow but no display"""
+    import copy, pickle
+    global _np
+    trans = Transform(101, 101, -10, -10, 10, 10)
+    xs = [-10.7, -10.14, -10, -9.99, -9.9, -9.1, -3.3, -0.11, -0.1, 0, 0.1, 5.5, 9.9, 10, 11]
+    ys = xs[::-1]
+    want = [trans.screen(x, y) for x, y in zip(xs, ys)]
+    flat = [v for x, y in zip(xs, ys) for v in (x, y)]
+    saved = _numpy()
+    for np in (saved, None):
+        _np = np
+        sx, sy = trans.screen_many(xs, ys)
+        assert list(zip(list(sx), list(sy))) == want, np
+        assert trans.screen_flat(flat) == [v for xy in want for v in xy], np
+    _np = saved
+
+    # Styles are shared, so copies and unpickled objects share them too
+    r = Rectangle(Point(1,2), Point(3,4))
+    r.setFill("red")
+    c = copy.deepcopy(r)
+    assert c.config is r.config and c.getP2().getX() == 3
+    assert type(r.p1) is _Coord and r.getP1() is not r.getP1()
+    c.setFill("blue")
+    assert r.config["fill"] == "red"
+    p = pickle.loads(pickle.dumps(Point(5,6)))
+    assert (p.getX(), p.getY()) == (5, 6) and p.config is Point(0,0).config
+
+    win = GraphWin("test", 100, 100, backend="offscreen")
+    win.setBackground("white")
+    def pixel(x, y):
+        return win.getFrame().getpixel((x, y))
+
+    r = Rectangle(Point(10,10), Point(30,30))
+    r.setFill("red")
+    r.draw(win)
+    assert pixel(20,20) == (255,0,0)
+    r.move(10,0)
+    assert pixel(35,20) == (255,0,0) and pixel(15,20) == (255,255,255)
+    rid = r.id
+    r.undraw()
+    assert pixel(35,20) == (255,255,255)
+
+    # An undrawn object's item is taken over by the next of its class
+    s = Rectangle(Point(60,10), Point(80,30))
+    s.setFill("blue")
+    s.draw(win)
+    assert s.id == rid and pixel(70,20) == (0,0,255) and pixel(35,20) == (255,255,255)
+    s.undraw()
+
+    # The Image pixel API works on an offscreen image without Tk
+    img = Image(Point(50,50), 4, 4).draw(win)
+    img.setPixel(1, 1, "blue")
+    assert img.getWidth() == 4 and img.getHeight() == 4
+    assert img.getPixel(1, 1) == [0,0,255]
+    assert pixel(49, 49) == (0,0,255)
+    if _numpy() is not None:
+        np = _numpy()
+        img.put_rows(2, 2, np.full((2,2,3), 255, dtype=np.uint8))
+        array = img.to_array()
+        assert array.shape == (4,4,3) and tuple(array[1,1]) == (0,0,255)
+        assert tuple(array[3,3]) == (255,255,255)
+    img.undraw()
+
+    # Clicks in an active hotspot run its command; others are queued
+    clicked = []
+    spot = win.addHotspot(Point(60,60), Point(90,90), clicked.append)
+    win.click(70, 70)
+    assert len(clicked) == 1 and win.checkMouse() is None
+    spot.active = False
+    win.click(70, 70)
+    assert len(clicked) == 1 and win.checkMouse().getX() == 70
+    spot.active = True
+    spot.remove()
+    spot.remove()       # already gone: does nothing
+    win.click(70, 70)
+    assert len(clicked) == 1 and win.checkMouse() is not None
+
+    # A Group is moved and recolored as a whole; a member undrawn while
+    # the group is hidden must not come back as a ghost of its old item
+    a = Rectangle(Point(5,40), Point(15,50))
+    b = Rectangle(Point(20,40), Point(30,50))
+    other = Rectangle(Point(40,40), Point(45,45))
+    other.draw(win)
+    g = Group(a, b)
+    g.draw(win)
+    g.setFill("green")
+    assert pixel(10,45) == pixel(25,45) == (0,128,0)
+    g.move(0,5)
+    assert pixel(10,52) == (0,128,0) and pixel(10,42) == (255,255,255)
+    g.undraw()
+    assert pixel(10,52) == (255,255,255)
+    a.undraw()
+    other.undraw()  # a is redrawn with this item, not its own
+    g.draw(win)
+    shown = [i for i, (kind, coords, options) in win._display.items()
+             if kind == "rectangle" and options.get("state") != "hidden"]
+    assert sorted(shown) == sorted([a.id, b.id]), shown
+    assert pixel(10,52) == (0,128,0) and pixel(42,42) == (255,255,255)
+    g.undraw()
+
+    # A member added to an inner group after the outer one is drawn
+    # moves, recolors and hides with the outer group
+    inner = Group(Rectangle(Point(5,40), Point(15,50)))
+    outer = Group(inner)
+    outer.draw(win)
+    late = Rectangle(Point(20,40), Point(30,50))
+    inner.add(late)
+    outer.move(0,5)
+    outer.setFill("blue")
+    assert late.getP1().getY() == 45 and late.config["fill"] == "blue"
+    assert pixel(25,52) == pixel(10,52) == (0,0,255) and pixel(25,42) == (255,255,255)
+    outer.undraw()
+    assert pixel(25,52) == (255,255,255)
+    later = Rectangle(Point(35,40), Point(45,50))
+    inner.add(later)
+    assert pixel(35,45) == (255,255,255)
+    outer.draw(win)
+    assert pixel(35,45) == (0,0,0)
+    outer.undraw()
+    assert pixel(35,45) == (255,255,255)
+
+    line = Polyline.fromXY([0,95, 50,95, 99,95])
+    line.setWidth(3)
+    line.draw(win)
+    assert pixel(25,95) == (0,0,0)
+    line.move(0,-10)
+    assert pixel(25,85) == (0,0,0) and pixel(25,95) == (255,255,255)
+    print("graphics offscreen: ok")
+
 #MacOS fix 2
 #tk.Toplevel(_root).destroy()
 
-# MacOS fix 1
-update()
-
 if __name__ == "__main__":
-    test()
+    if sys.argv[1:] == ["offscreen"]:
+        test_offscreen()
+    else:
+        test()
@@ -0,0 +1,366 @@
+# handeval.py
+"""Table driven poker hand evaluator.
+
+Cards are small integers 0..51 laid out the same way Deck builds them,
+rank major: code = rank * 4 + suit, where rank indexes "23456789TJQKA"
+and suit indexes the four suits. evaluate() maps any 5, 6 or 7 card
+set to one integer strength; a larger strength is a better hand and
+equal strengths tie.
+
+All of the work is done once, on the first evaluation:
+
+  * every rank multiset of 5 to 7 cards is keyed by the product of one
+    prime per rank, and the key maps straight to the strength of the
+    best five cards that can be made from it;
+  * a 13-bit mask of the ranks held in one suit maps to the strength of
+    the best flush (or straight flush) in that suit.
+
+A 7 card hand can hold at most one suit of five or more cards, and a
+hand with such a flush can never also make quads or a full house, so
+a single lookup in one of the two tables is always enough.
+
+evaluate_batch() does the same lookups with numpy for a whole array of
+hands at once; numpy is optional, only needed there and only imported
+then. Importing the module itself is cheap. EvalCache
+remembers recent results by card mask, for callers that grade the
+same hands over and over."""
+
+import itertools
+from collections import OrderedDict, namedtuple
+
+_np = False
+
+def _numpy():
+    # numpy is only needed for evaluate_batch. It is imported on first
+    # use since importing it takes longer than the rest of the module.
+    global _np
+    if _np is False:
+        try:
+            import numpy
+            _np = numpy
+        except ImportError:
+            _np = None
+    return _np
+
+RANKS = "23456789TJQKA"
+
+CATEGORIES = ("High card", "One pair", "Two pair", "Three of a kind",
+              "Straight", "Flush", "Full house", "Four of a kind",
+              "Straight flush")
+
+HIGH_CARD, ONE_PAIR, TWO_PAIR, THREE_OF_A_KIND, STRAIGHT, FLUSH, \
+    FULL_HOUSE, FOUR_OF_A_KIND, STRAIGHT_FLUSH = range(9)
+
+_PRIMES_BY_RANK = (2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41)
+
+# Per card lookups, indexed by card code
+_PRIMES = [_PRIMES_BY_RANK[code >> 2] for code in range(52)]
+_RANK_BITS = [1 << (code >> 2) for code in range(52)]
+# Octal digit per suit: the sum over at most 7 cards never carries
+_SUIT_WEIGHTS = [1 << (3 * (code & 3)) for code in range(52)]
+
+
+def _straight_top(mask):
+    """Return the rank of the highest straight in a 13-bit rank mask,
+    or -1 if there is none. The wheel (A-2-3-4-5) tops out at the 5."""
+    for top in range(12, 3, -1):
+        window = 0x1f << (top - 4)
+        if mask & window == window:
+            return top
+    if mask & 0x100f == 0x100f:
+        return 3
+    return -1
+
+
+def _best_flush(held):
+    """Best hand description for five suited cards; held lists their
+    ranks, highest first."""
+    top = _straight_top(sum(1 << r for r in held))
+    if top >= 0:
+        return (STRAIGHT_FLUSH, top)
+    return (FLUSH,) + tuple(held)
+
+
+def _best_unsuited(held):
+    """Best hand description for a rank multiset, ignoring suits.
+    held lists the rank of every card, highest first."""
+    groups = {}
+    for r in held:
+        groups[r] = groups.get(r, 0) + 1
+    # Ranks ordered by (count, rank), largest first
+    order = sorted(groups, key=lambda r: (groups[r], r), reverse=True)
+    first = groups[order[0]]
+    second = groups[order[1]] if len(order) > 1 else 0
+    distinct = sorted(groups, reverse=True)
+
+    if first == 4:
+        q = order[0]
+        return (FOUR_OF_A_KIND, q, next(r for r in distinct if r != q))
+    if first == 3 and second >= 2:
+        t = order[0]
+        return (FULL_HOUSE, t, max(r for r in distinct if r != t and groups[r] >= 2))
+    top = _straight_top(sum(1 << r for r in distinct))
+    if top >= 0:
+        return (STRAIGHT, top)
+    if first == 3:
+        t = order[0]
+        return (THREE_OF_A_KIND, t) + tuple(r for r in distinct if r != t)[:2]
+    if second == 2:
+        hi, lo = order[:2]
+        return (TWO_PAIR, hi, lo, next(r for r in distinct if r not in (hi, lo)))
+    if first == 2:
+        p = order[0]
+        return (ONE_PAIR, p) + tuple(r for r in distinct if r != p)[:3]
+    return (HIGH_CARD,) + tuple(distinct[:5])
+
+
+def _build_tables():
+    # Describe every five card hand first. Each description gets a
+    # strength numbered from weakest to strongest; there are 7462 of
+    # them, and strength 0 is never used.
+    five = {}
+    flush = {}
+    for held in itertools.combinations_with_replacement(range(12, -1, -1), 5):
+        if held[0] != held[4]:
+            key = 1
+            for r in held:
+                key *= _PRIMES_BY_RANK[r]
+            five[key] = _best_unsuited(held)
+        if len(set(held)) == 5:
+            flush[sum(1 << r for r in held)] = _best_flush(held)
+    ordered = sorted(set(five.values()) | set(flush.values()))
+    strength = {desc: i + 1 for i, desc in enumerate(ordered)}
+
+    # A bigger hand is worth as much as its best subset with one card
+    # fewer.
+    rank_table = {key: strength[desc] for key, desc in five.items()}
+    for size in (6, 7):
+        for held in itertools.combinations_with_replacement(range(12, -1, -1), size):
+            if any(a == b for a, b in zip(held, held[4:])):
+                continue    # five of a rank
+            key = 1
+            for r in held:
+                key *= _PRIMES_BY_RANK[r]
+            rank_table[key] = max(rank_table[key // _PRIMES_BY_RANK[r]]
+                                  for r in set(held))
+
+    flush_table = [0] * (1 << 13)
+    for mask, desc in flush.items():
+        flush_table[mask] = strength[desc]
+    for size in (6, 7):
+        for held in itertools.combinations(range(13), size):
+            mask = sum(1 << r for r in held)
+            flush_table[mask] = max(flush_table[mask & ~(1 << r)] for r in held)
+
+    category_of = [HIGH_CARD] + [desc[0] for desc in ordered]
+    return rank_table, flush_table, category_of
+
+
+def _flush_suits():
+    # Which suit (if any) holds five or more cards, keyed by the sum of
+    # _SUIT_WEIGHTS over a hand
+    flush_suit = [-1] * (1 << 12)
+    for total in range(1 << 12):
+        for suit in range(4):
+            if (total >> (3 * suit)) & 7 >= 5:
+                flush_suit[total] = suit
+    return flush_suit
+
+
+# Built by _load_tables() on first use. That takes a few tenths of a
+# second, which programs that only show cards, and every worker process
+# of a simulation, should not pay on import.
+_RANK_TABLE = _FLUSH_TABLE = _CATEGORY_OF = _FLUSH_SUIT = None
+
+def _load_tables():
+    global _RANK_TABLE, _FLUSH_TABLE, _CATEGORY_OF, _FLUSH_SUIT
+    if _RANK_TABLE is None:
+        _FLUSH_SUIT = _flush_suits()
+        _RANK_TABLE, _FLUSH_TABLE, _CATEGORY_OF = _build_tables()
+
+
+# The number of distinct five card hand strengths
+MAX_STRENGTH = 7462
+
+
+def card_code(rank, suit):
+    """Return the code of the card with rank index rank (0 for a deuce,
+    12 for an ace) and suit index suit (0..3)."""
+    return rank * 4 + suit
+
+
+def evaluate(cards):
+    """Return the strength of the best five card hand that can be made
+    from cards, a sequence of 5 to 7 distinct card codes."""
+    if _RANK_TABLE is None:
+        _load_tables()
+    key = 1
+    suits = 0
+    for c in cards:
+        key *= _PRIMES[c]
+        suits += _SUIT_WEIGHTS[c]
+    suit = _FLUSH_SUIT[suits]
+    if suit < 0:
+        return _RANK_TABLE[key]
+    mask = 0
+    for c in cards:
+        if c & 3 == suit:
+            mask |= _RANK_BITS[c]
+    return _FLUSH_TABLE[mask]
+
+
+_batch_tables = None
+
+def _get_batch_tables():
+    global _batch_tables
+    if _batch_tables is None:
+        np = _numpy()
+        _load_tables()
+        keys = np.array(sorted(_RANK_TABLE), dtype=np.int64)
+        strengths = np.array([_RANK_TABLE[k] for k in keys.tolist()], dtype=np.int32)
+        _batch_tables = (np.array(_PRIMES, dtype=np.int64), keys, strengths,
+                         np.array(_SUIT_WEIGHTS, dtype=np.int16),
+                         np.array(_FLUSH_SUIT, dtype=np.int8),
+                         np.array(_FLUSH_TABLE, dtype=np.int32))
+    return _batch_tables
+
+
+def evaluate_batch(cards):
+    """Evaluate many hands at once. cards is an (N, k) integer array of
+    card codes with 5 <= k <= 7, one hand per row. Returns an (N,) array
+    of strengths equal to evaluate() on each row. Requires numpy."""
+    np = _numpy()
+    if np is None:
+        raise ImportError("evaluate_batch requires numpy")
+    primes, keys, strengths, suit_weights, flush_suits, flush_table = \
+        _get_batch_tables()
+    cards = np.asarray(cards, dtype=np.int64)
+    if cards.ndim != 2 or not 5 <= cards.shape[1] <= 7:
+        raise ValueError("cards must have shape (N, 5..7)")
+
+    # Rank multiset -> strength, by binary search over the sorted keys.
+    # The product of seven primes up to 41 fits comfortably in int64.
+    result = strengths[np.searchsorted(keys, primes[cards].prod(axis=1))]
+
+    # Hands with five or more cards of one suit use the flush table.
+    suit = flush_suits[suit_weights[cards].sum(axis=1)]
+    flushed = np.flatnonzero(suit >= 0)
+    if flushed.size:
+        held = cards[flushed]
+        bits = np.where(held & 3 == suit[flushed, None], 1 << (held >> 2), 0)
+        result[flushed] = flush_table[np.bitwise_or.reduce(bits, axis=1)]
+    return result
+
+
+def category(strength):
+    """Return the category name ("Flush", "One pair", ...) of a strength"""
+    if _CATEGORY_OF is None:
+        _load_tables()
+    return CATEGORIES[_CATEGORY_OF[strength]]
+
+
+def category_index(strength):
+    """Return the category of a strength as an index into CATEGORIES"""
+    if _CATEGORY_OF is None:
+        _load_tables()
+    return _CATEGORY_OF[strength]
+
+
+def category_batch(strengths):
+    """Vectorized category_index for an array of strengths"""
+    if _CATEGORY_OF is None:
+        _load_tables()
+    return _numpy().asarray(_CATEGORY_OF, dtype=np.int8)[strengths]
+
+
+CacheInfo = namedtuple("CacheInfo", "hits misses maxsize currsize")
+
+
+class EvalCache:
+
+    """Bounded cache of hand strengths keyed by the hand's 52-bit card
+    mask (bit c set for card code c). The least recently used entry is
+    dropped when the cache is full; hits and misses are counted."""
+
+    def __init__(self, maxsize=1 << 16):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+
+    def __len__(self):
+        return len(self._data)
+
+    def evaluate_mask(self, mask):
+        data = self._data
+        try:
+            strength = data[mask]
+        except KeyError:
+            self.misses += 1
+            codes = []
+            m = mask
+            while m:
+                low = m & -m
+                codes.append(low.bit_length() - 1)
+                m ^= low
+            strength = data[mask] = evaluate(codes)
+            if len(data) > self.maxsize:
+                data.popitem(last=False)
+            return strength
+        self.hits += 1
+        data.move_to_end(mask)
+        return strength
+
+    def evaluate(self, cards):
+        """evaluate() through the cache, for a sequence of card codes"""
+        mask = 0
+        for c in cards:
+            mask |= 1 << c
+        return self.evaluate_mask(mask)
+
+    def info(self):
+        return CacheInfo(self.hits, self.misses, self.maxsize, len(self._data))
+
+    def clear(self):
+        self._data.clear()
+        self.hits = self.misses = 0
+
+
+# Shared by the game engine and the GUI
+cache = EvalCache()
+
+
+def test():
+    """Check the tables against the textbook counts of each category over
+    all C(52,5) hands, and 7 card hands against their best 5 card subset."""
+    import random
+    expected = [1302540, 1098240, 123552, 54912, 10200, 5108, 3744, 624, 40]
+    seen = [0] * len(CATEGORIES)
+    for hand in itertools.combinations(range(52), 5):
+        seen[category_index(evaluate(hand))] += 1
+    assert seen == expected, seen
+    assert len(_CATEGORY_OF) - 1 == MAX_STRENGTH, len(_CATEGORY_OF)
+
+    rng = random.Random(1)
+    for _ in range(20000):
+        hand = rng.sample(range(52), 7)
+        best = max(evaluate(five) for five in itertools.combinations(hand, 5))
+        assert evaluate(hand) == best, hand
+
+    np = _numpy()
+    if np is not None:
+        hands = np.array([rng.sample(range(52), 7) for _ in range(20000)])
+        batch = evaluate_batch(hands)
+        assert batch.tolist() == [evaluate(h) for h in hands.tolist()]
+        assert evaluate_batch(hands[:, :5]).tolist() == \
+            [evaluate(h) for h in hands[:, :5].tolist()]
+    cache = EvalCache(maxsize=2)
+    hands = [[0, 4, 8, 12, 16], [51, 47, 43, 39, 35], [1, 2, 3, 5, 6]]
+    for hand in hands + hands[1:]:
+        assert cache.evaluate(hand) == evaluate(hand)
+    assert cache.info() == CacheInfo(2, 3, 2, 2), cache.info()
+    print("handeval: ok")
+
+
+if __name__ == "__main__":
+    test()
@@ -0,0 +1,299 @@
+# handindex.py
+"""Dense indices for hands up to suit isomorphism.
+
+Two hands that differ only by a renaming of the suits play the same
+way. A HandIndexer numbers the classes of such hands densely: cards
+are dealt in rounds (by default the 2 hole cards, then the 3 card
+flop, the turn and the river), and for each round r every class of
+deals through round r gets an index in range(size(r)). For Poker
+Solitaire that is 169 pre-flop, 1,286,792 flop, 55,190,538 turn and
+2,428,287,420 river classes.
+
+The scheme follows Waugh's hand isomorphism indexer. Within one suit,
+the ranks dealt in each round are numbered with the combinatorial
+number system. Suits that received the same number of cards in every
+round are interchangeable, so their numbers are combined as a
+multiset. Finally, each pattern of per-suit counts gets its own block
+of indices.
+
+Cards are card codes (rank * 4 + suit), listed round by round;
+index_cards() and unindex_cards() work with cards.Card objects."""
+
+from bisect import bisect_right
+from math import comb
+
+from cards import Card
+
+RANKS = 13
+SUITS = 4
+
+# _COMB[n][k] == comb(n, k) for the small n used within one suit
+_COMB = [[comb(n, k) for k in range(RANKS + 1)] for n in range(RANKS + 1)]
+
+
+def _bits(mask):
+    """Positions of the set bits of mask, lowest first."""
+    out = []
+    while mask:
+        low = mask & -mask
+        out.append(low.bit_length() - 1)
+        mask ^= low
+    return out
+
+
+def _colex(positions):
+    """Colexicographic rank of a set of distinct positions"""
+    return sum(comb(p, k) for k, p in enumerate(sorted(positions), 1))
+
+
+def _uncolex(value, k):
+    """Inverse of _colex for a set of k positions."""
+    positions = []
+    for j in range(k, 0, -1):
+        # Largest p with comb(p, j) <= value, by binary search
+        lo, hi = j - 1, value + j
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if comb(mid, j) <= value:
+                lo = mid
+            else:
+                hi = mid - 1
+        value -= comb(lo, j)
+        positions.append(lo)
+    return positions
+
+
+def _suit_index(suit_masks):
+    """Number one suit's ranks, given one mask per round: each round's
+    ranks are numbered among the ranks not dealt in earlier rounds, and
+    the rounds are combined in mixed radix."""
+    index = 0
+    scale = 1
+    used = 0
+    free = RANKS
+    for mask in suit_masks:
+        k = 0
+        value = 0
+        m = mask
+        while m:
+            low = m & -m
+            k += 1
+            # position of this rank among the free ranks
+            value += _COMB[low.bit_length() - 1 - (used & (low - 1)).bit_count()][k]
+            m ^= low
+        index += scale * value
+        scale *= _COMB[free][k]
+        free -= k
+        used |= mask
+    return index
+
+
+def _multiset_index(values):
+    """Rank of a multiset of numbers given as a non-increasing list"""
+    m = len(values)
+    return _colex(v + m - 1 - i for i, v in enumerate(values))
+
+
+def _multiset_unindex(value, m):
+    """Inverse of _multiset_index: a non-increasing list of m numbers"""
+    positions = _uncolex(value, m)          # decreasing
+    return [p - (m - 1 - i) for i, p in enumerate(positions)]
+
+
+class HandIndexer:
+
+    def __init__(self, rounds=(2, 3, 1, 1)):
+        self.rounds = tuple(rounds)
+        self.totals = [sum(self.rounds[:r + 1]) for r in range(len(self.rounds))]
+        self._round_at = [j for j, n in enumerate(self.rounds) for _ in range(n)]
+        self._blocks = []    # per round: {config: (offset, groups)}
+        self._offsets = []   # per round: sorted offsets, for unindex
+        self._configs = []   # per round: configs in offset order
+        self._sizes = []
+        for r in range(len(self.rounds)):
+            blocks = {}
+            offsets = []
+            configs = []
+            offset = 0
+            for config in self._patterns(r):
+                groups = []
+                for counts in config:
+                    if groups and groups[-1][0] == counts:
+                        groups[-1][1] += 1
+                    else:
+                        groups.append([counts, 1])
+                groups = [(counts, m, comb(self._suit_size(counts) + m - 1, m))
+                          for counts, m in groups]
+                blocks[config] = (offset, groups)
+                offsets.append(offset)
+                configs.append(config)
+                size = 1
+                for _, _, n in groups:
+                    size *= n
+                offset += size
+            self._blocks.append(blocks)
+            self._offsets.append(offsets)
+            self._configs.append(configs)
+            self._sizes.append(offset)
+
+    def _patterns(self, r):
+        """Every way of splitting each round's cards over the four suits,
+        as a non-increasing tuple of per-suit count tuples."""
+        per_suit = [()]
+        for j in range(r + 1):
+            per_suit = [c + (n,) for c in per_suit for n in range(self.rounds[j] + 1)
+                        if sum(c) + n <= RANKS]
+        per_suit.sort(reverse=True)
+        target = self.rounds[:r + 1]
+        found = []
+
+        def pick(start, chosen, left):
+            if len(chosen) == SUITS:
+                if not any(left):
+                    found.append(tuple(chosen))
+                return
+            for i in range(start, len(per_suit)):
+                counts = per_suit[i]
+                if all(c <= l for c, l in zip(counts, left)):
+                    pick(i, chosen + [counts], [l - c for c, l in zip(counts, left)])
+
+        pick(0, [], list(target))
+        return found
+
+    @staticmethod
+    def _suit_size(counts):
+        size = 1
+        used = 0
+        for c in counts:
+            size *= comb(RANKS - used, c)
+            used += c
+        return size
+
+    def size(self, r):
+        """Number of classes of deals through round r"""
+        return self._sizes[r]
+
+    def round_of(self, n_cards):
+        """The round that a deal of n_cards cards runs through"""
+        try:
+            return self.totals.index(n_cards)
+        except ValueError:
+            raise ValueError("no round deals {} cards".format(n_cards)) from None
+
+    def index(self, cards):
+        """Index of a deal, given as card codes in dealing order"""
+        r = self.round_of(len(cards))
+        masks = [[0] * (r + 1) for _ in range(SUITS)]
+        seen = 0
+        for c, j in zip(cards, self._round_at):
+            if seen >> c & 1:
+                raise ValueError("duplicate card {}".format(c))
+            seen |= 1 << c
+            masks[c & 3][j] |= 1 << (c >> 2)
+
+        items = sorted(((tuple(m.bit_count() for m in suit_masks),
+                         _suit_index(suit_masks)) for suit_masks in masks),
+                       reverse=True)
+
+        offset, groups = self._blocks[r][tuple(counts for counts, _ in items)]
+        value = 0
+        pos = 0
+        for counts, m, n in groups:
+            if m == 1:
+                part = items[pos][1]
+            else:
+                part = _multiset_index([i for _, i in items[pos:pos + m]])
+            value = value * n + part
+            pos += m
+        return offset + value
+
+    @staticmethod
+    def _suit_unindex(index, counts):
+        masks = []
+        used = 0
+        for c in counts:
+            free = [p for p in range(RANKS) if not used >> p & 1]
+            n = comb(len(free), c)
+            index, value = divmod(index, n)
+            mask = 0
+            for p in _uncolex(value, c):
+                mask |= 1 << free[p]
+            masks.append(mask)
+            used |= mask
+        return masks
+
+    def unindex(self, r, index):
+        """The canonical deal through round r with the given index, as
+        card codes in dealing order"""
+        if not 0 <= index < self._sizes[r]:
+            raise ValueError("index out of range")
+        k = bisect_right(self._offsets[r], index) - 1
+        config = self._configs[r][k]
+        offset, groups = self._blocks[r][config]
+        value = index - offset
+        parts = []
+        for counts, m, n in reversed(groups):
+            value, part = divmod(value, n)
+            parts.append((counts, _multiset_unindex(part, m)))
+        parts.reverse()
+
+        rounds = [[] for _ in range(r + 1)]
+        suit = 0
+        for counts, suit_indices in parts:
+            for i in suit_indices:
+                for j, mask in enumerate(self._suit_unindex(i, counts)):
+                    rounds[j].extend(rank * 4 + suit for rank in _bits(mask))
+                suit += 1
+        return [c for cards in rounds for c in sorted(cards)]
+
+    def canonical(self, cards):
+        """The representative of the class of a deal of card codes"""
+        return self.unindex(self.round_of(len(cards)), self.index(cards))
+
+    def index_cards(self, cards):
+        """index() for a list of Card objects"""
+        return self.index([card.code for card in cards])
+
+    def unindex_cards(self, r, index):
+        """unindex() returning Card objects"""
+        return [Card.from_code(code) for code in self.unindex(r, index)]
+
+
+_default = None
+
+def default_indexer():
+    """The shared indexer for Poker Solitaire's rounds (2, 3, 1, 1)"""
+    global _default
+    if _default is None:
+        _default = HandIndexer()
+    return _default
+
+
+def test():
+    """Check that index() is a bijection onto range(size(r)): unindex()
+    inverts it everywhere on the pre-flop and flop rounds and on samples
+    of the later ones, and suit renamings never change an index."""
+    import random, itertools
+    indexer = HandIndexer()
+    assert [indexer.size(r) for r in range(4)] == [169, 1286792, 55190538, 2428287420]
+
+    seen = {indexer.index(list(hole)) for hole in itertools.permutations(range(52), 2)}
+    assert seen == set(range(169))
+    for r in (0, 1):
+        for i in range(indexer.size(r)):
+            assert indexer.index(indexer.unindex(r, i)) == i, (r, i)
+
+    rng = random.Random(9)
+    for r in range(4):
+        for _ in range(20000):
+            i = rng.randrange(indexer.size(r))
+            assert indexer.index(indexer.unindex(r, i)) == i, (r, i)
+            deal = rng.sample(range(52), indexer.totals[r])
+            suits = rng.sample(range(4), 4)
+            renamed = [c & ~3 | suits[c & 3] for c in deal]
+            assert indexer.index(deal) == indexer.index(renamed), deal
+    print("handindex: ok")
+
+
+if __name__ == "__main__":
+    test()
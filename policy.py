@@ -0,0 +1,245 @@
+# policy.py
+"""Precomputed stay/fold decisions for Poker Solitaire.
+
+At each stage the player compares two expected scores. If W is the
+chance that their hand wins the showdown, folding is worth
+FOLD_POINTS[stage] * (1 - 2W). Staying on the river is worth
+SHOWDOWN_POINTS * (2W - 1). Staying earlier is worth the average,
+over the next community cards, of playing the next stage as well as
+possible. A Solver works these values out backwards from the river.
+It enumerates every dealer hole card pair exactly and averages over
+every next board (or a random sample of them) at the earlier stages.
+
+build() stores the best decision for every suit-isomorphism class of
+(hole cards, visible board) at one stage in a table file, one byte per
+class. A decision does not depend on the order the board was dealt
+in, so each stage's table is laid out by a handindex indexer with the
+board as one round (stage_indexer). Policy memory-maps those files and
+answers a decision with a single index computation and a byte read. A
+Policy can also be handed to Solitaire.play or simulate as a strategy.
+
+Building every table exactly is a large offline job: the river table
+alone has 123 million classes. Tables can be built in pieces (start,
+stop), in parallel (workers), and resumed, because unsolved entries
+are zero and solved ones are skipped."""
+
+import itertools
+import mmap
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+
+import equity
+import handindex
+from solitaire import STAY, FOLD, FOLD_POINTS, SHOWDOWN_POINTS, BOARD_SIZES, \
+    STAGE_NAMES, RIVER
+
+UNSOLVED, STAY_BYTE, FOLD_BYTE = 0, 1, 2
+
+
+_indexers = {}
+
+def stage_indexer(stage):
+    """The indexer for (hole cards, board) at stage, with the board
+    as a single unordered round"""
+    if stage not in _indexers:
+        board = BOARD_SIZES[stage]
+        _indexers[stage] = handindex.HandIndexer((2, board) if board else (2,))
+    return _indexers[stage]
+
+
+def fold_value(stage, win):
+    return FOLD_POINTS[stage] * (1 - 2 * win)
+
+
+def showdown_value(win):
+    return SHOWDOWN_POINTS * (2 * win - 1)
+
+
+class Solver:
+
+    """Expected values of staying and folding.
+
+    With samples=None every possible next board is considered and the
+    values are exact. Otherwise at most samples random next deals are
+    averaged at each stage before the river, which is much cheaper."""
+
+    def __init__(self, samples=None, seed=0):
+        self.samples = samples
+        self.rng = random.Random(seed)
+
+    def values(self, hole, board):
+        """Return (win, stay, fold): the chance of winning the showdown
+        and the expected points for staying and for folding now"""
+        stage = BOARD_SIZES.index(len(board))
+        win, stay = self._stay(list(hole), list(board))
+        return win, stay, fold_value(stage, win)
+
+    def decide(self, hole, board):
+        win, stay, fold = self.values(hole, board)
+        return STAY if stay >= fold else FOLD
+
+    def _stay(self, hole, board):
+        # (win, value of staying) for a state
+        if len(board) == 5:
+            w, t, l = equity.river_counts(hole, [board])[0]
+            win = w / (w + t + l)
+            return win, showdown_value(win)
+        deals = self._next_deals(hole, board)
+        total = sum(weight for _, weight in deals)
+        win = stay = 0.0
+        if len(board) == 4:
+            # All the rivers are graded in one batch
+            results = equity.river_counts(hole, [board + extra for extra, _ in deals])
+            for (w, t, l), (_, weight) in zip(results, deals):
+                w_next = w / (w + t + l)
+                win += weight * w_next
+                stay += weight * max(showdown_value(w_next), fold_value(RIVER, w_next))
+        else:
+            stage = BOARD_SIZES.index(len(board)) + 1
+            for extra, weight in deals:
+                w_next, s_next = self._stay(hole, board + extra)
+                win += weight * w_next
+                stay += weight * max(s_next, fold_value(stage, w_next))
+        return win / total, stay / total
+
+    def _next_deals(self, hole, board):
+        # The possible next community cards as (cards, weight) pairs,
+        # folding suit-isomorphic deals into one
+        stage = BOARD_SIZES.index(len(board))
+        known = set(hole + board)
+        rest = [c for c in range(52) if c not in known]
+        deals = itertools.combinations(rest, BOARD_SIZES[stage + 1] - len(board))
+        if self.samples is not None:
+            deals = list(deals)
+            if len(deals) > self.samples:
+                return [(list(d), 1) for d in self.rng.sample(deals, self.samples)]
+        indexer = stage_indexer(stage + 1)
+        classes = {}
+        for extra in deals:
+            i = indexer.index(hole + board + list(extra))
+            if i in classes:
+                classes[i][1] += 1
+            else:
+                classes[i] = [list(extra), 1]
+        return list(classes.values())
+
+
+def table_path(directory, stage):
+    return os.path.join(directory, "policy-{}.bin".format(STAGE_NAMES[stage].lower()))
+
+
+def _solve_range(path, stage, start, stop, samples, seed):
+    indexer = stage_indexer(stage)
+    solver = Solver(samples, seed + start)
+    solved = 0
+    with open(path, "r+b") as f, mmap.mmap(f.fileno(), 0) as table:
+        for i in range(start, stop):
+            if table[i] == UNSOLVED:
+                cards = indexer.unindex(len(indexer.rounds) - 1, i)
+                decision = solver.decide(cards[:2], cards[2:])
+                table[i] = STAY_BYTE if decision == STAY else FOLD_BYTE
+                solved += 1
+    return solved
+
+
+def build(directory, stage, start=0, stop=None, samples=None, seed=0,
+          workers=1, chunk=1000):
+    """Solve the classes start..stop-1 of stage's table in directory,
+    creating the table if needed. Returns the number of entries solved."""
+    indexer = stage_indexer(stage)
+    size = indexer.size(len(indexer.rounds) - 1)
+    stop = size if stop is None else min(stop, size)
+    path = table_path(directory, stage)
+    if not os.path.exists(path):
+        os.makedirs(directory, exist_ok=True)
+        with open(path, "wb") as f:
+            f.truncate(size)
+    elif os.path.getsize(path) != size:
+        raise ValueError("{} is not a table of {} entries".format(path, size))
+    starts = range(start, stop, chunk)
+    args = ([path] * len(starts), [stage] * len(starts), starts,
+            [min(s + chunk, stop) for s in starts],
+            [samples] * len(starts), [seed] * len(starts))
+    if workers > 1:
+        with ProcessPoolExecutor(workers) as pool:
+            return sum(pool.map(_solve_range, *args))
+    return sum(map(_solve_range, *args))
+
+
+class Policy:
+
+    """Read-only view of the tables in a directory. Stages without a
+    table, and entries not solved yet, answer None from decide()."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.tables = {}
+        for stage in range(len(BOARD_SIZES)):
+            path = table_path(directory, stage)
+            if os.path.exists(path) and os.path.getsize(path):
+                indexer = stage_indexer(stage)
+                size = indexer.size(len(indexer.rounds) - 1)
+                if os.path.getsize(path) != size:
+                    raise ValueError("{} is not a table of {} entries".format(path, size))
+                with open(path, "rb") as f:
+                    self.tables[stage] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __getstate__(self):
+        return self.directory
+
+    def __setstate__(self, directory):
+        self.__init__(directory)
+
+    def decide(self, hole, board):
+        stage = BOARD_SIZES.index(len(board))
+        table = self.tables.get(stage)
+        if table is None:
+            return None
+        entry = table[stage_indexer(stage).index(list(hole) + list(board))]
+        if entry == UNSOLVED:
+            return None
+        return STAY if entry == STAY_BYTE else FOLD
+
+    def __call__(self, game):
+        # Strategy interface; states with no decision stay
+        return self.decide(game.player, game.board()) or STAY
+
+
+def test():
+    """Solve a few random states at every stage into tables in a
+    scratch directory and check that Policy answers what Solver does,
+    for the state and for a suit renaming of it."""
+    import tempfile
+    rng = random.Random(5)
+    with tempfile.TemporaryDirectory() as directory:
+        for stage, samples in enumerate((3, 3, None, None)):
+            indexer = stage_indexer(stage)
+            for _ in range(3):
+                deal = rng.sample(range(52), 2 + BOARD_SIZES[stage])
+                i = indexer.index(deal)
+                assert build(directory, stage, i, i + 1, samples, chunk=1) == 1
+                cards = indexer.unindex(len(indexer.rounds) - 1, i)
+                expected = Solver(samples, i).decide(cards[:2], cards[2:])
+                policy = Policy(directory)
+                assert policy.decide(deal[:2], deal[2:]) == expected, (stage, deal)
+                suits = rng.sample(range(4), 4)
+                renamed = [c & ~3 | suits[c & 3] for c in deal]
+                assert policy.decide(renamed[:2], renamed[2:]) == expected, (stage, renamed)
+                if samples is None:
+                    assert Solver().decide(deal[:2], deal[2:]) == expected, (stage, deal)
+    print("policy: ok")
+
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) == 1:
+        test()
+        sys.exit()
+    if len(sys.argv) < 3:
+        print("usage: python policy.py DIRECTORY STAGE [SAMPLES [WORKERS]]")
+        sys.exit(2)
+    stage = [name.lower() for name in STAGE_NAMES].index(sys.argv[2].lower())
+    samples = int(sys.argv[3]) if len(sys.argv) > 3 else None
+    workers = int(sys.argv[4]) if len(sys.argv) > 4 else os.cpu_count()
+    print(build(sys.argv[1], stage, samples=samples, workers=workers), "entries solved")
@@ -0,0 +1,263 @@
+# solitaire.py
+"""The rules of Poker Solitaire, with no graphics.
+
+The player and the dealer each get two hole cards; the dealer's stay
+hidden. At each stage (pre-flop, flop, turn, river) the player either
+stays, which deals the next community cards, or folds. Staying on the
+river goes to the showdown: +100 if the player's best hand beats the
+dealer's, -100 otherwise. A fold deals out the rest of the board
+anyway and scores FOLD_POINTS for the stage, positive if the player
+would not have won and negative if they would have.
+
+A Solitaire object plays one game after another. It is driven either
+by calling stay() and fold() (as the GUI in pro2,2.py does) or by
+play() with a strategy: a function that takes a PlayerView of the game
+and returns STAY or FOLD. The view shows only what the player knows,
+so a strategy cannot peek at the dealer's cards or the undealt board.
+An optional observer is told about every deal and result so a display
+can follow along.
+
+simulate() plays many games across worker processes and merges their
+Stats."""
+
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+
+import handeval
+
+STAY = "Stay"
+FOLD = "Fold"
+
+PRE_FLOP, FLOP, TURN, RIVER = range(4)
+STAGE_NAMES = ("Pre-Flop", "Flop", "Turn", "River")
+BOARD_SIZES = (0, 3, 4, 5)          # community cards showing at each stage
+FOLD_POINTS = (100, 75, 50, 25)
+SHOWDOWN_POINTS = 100
+
+
+class Observer:
+
+    """Base class for things that watch a Solitaire game. Every method
+    does nothing; override the ones you need."""
+
+    def hole_cards_dealt(self, game):
+        """A new game has started; game.player and game.dealer are set."""
+
+    def board_dealt(self, game, cards):
+        """The stage advanced and cards (codes) were added to the board."""
+
+    def game_over(self, game, points):
+        """The game ended, scoring points; the score is already updated."""
+
+
+class PlayerView:
+
+    """What a strategy sees of a game: the player's hole cards, the
+    board showing, the stage and the game's random stream"""
+
+    __slots__ = ("player", "stage", "rng", "_board")
+
+    def __init__(self, game):
+        self.player = list(game.player)
+        self.stage = game.stage
+        self.rng = game.rng
+        self._board = game.board()
+
+    def board(self):
+        """Community cards showing"""
+        return list(self._board)
+
+
+class Solitaire:
+
+    def __init__(self, rng=None, observer=None, cache=handeval.cache):
+        # rng is any random.Random-like object. cache is a
+        # handeval.EvalCache, or None to evaluate every hand afresh
+        self.rng = rng or random.Random()
+        self.observer = observer
+        self.cache = cache
+        self.score = 0
+        self.num_games = 0
+        self.stays = [0, 0, 0, 0]       # decisions made at each stage
+        self.folds = [0, 0, 0, 0]
+        self.player = []
+        self.dealer = []
+        self.community = []
+        self.stage = PRE_FLOP
+        self.finished = True
+        self.points = None
+
+    def new_game(self):
+        # Deal everything up front; the board is revealed stage by stage
+        deal = self.rng.sample(range(52), 9)
+        self.player = deal[0:2]
+        self.dealer = deal[2:4]
+        self.community = deal[4:9]
+        self.stage = PRE_FLOP
+        self.finished = False
+        self.points = None
+        if self.observer:
+            self.observer.hole_cards_dealt(self)
+
+    def board(self):
+        """Community cards showing at the current stage"""
+        return self.community[:BOARD_SIZES[self.stage]]
+
+    def stay(self):
+        self.stays[self.stage] += 1
+        if self.stage == RIVER:
+            self.showdown()
+            return
+        shown = BOARD_SIZES[self.stage]
+        self.stage += 1
+        if self.observer:
+            self.observer.board_dealt(self, self.community[shown:BOARD_SIZES[self.stage]])
+
+    def fold(self):
+        self.folds[self.stage] += 1
+        would_have_won = self.get_winner() == "Player"
+        points = FOLD_POINTS[self.stage]
+        self.finish(-points if would_have_won else points)
+
+    def showdown(self):
+        winner = self.get_winner()
+        self.finish(SHOWDOWN_POINTS if winner == "Player" else -SHOWDOWN_POINTS)
+
+    def get_winner(self):
+        if self.cache is None:
+            player = handeval.evaluate(self.player + self.community)
+            dealer = handeval.evaluate(self.dealer + self.community)
+            return self._compare(player, dealer)
+        # Hands are looked up by card mask, so replaying a deal is cheap
+        board = 0
+        for c in self.community:
+            board |= 1 << c
+        p1, p2 = self.player
+        d1, d2 = self.dealer
+        player = self.cache.evaluate_mask(board | 1 << p1 | 1 << p2)
+        dealer = self.cache.evaluate_mask(board | 1 << d1 | 1 << d2)
+        return self._compare(player, dealer)
+
+    @staticmethod
+    def _compare(player, dealer):
+        if player > dealer:
+            return "Player"
+        elif player < dealer:
+            return "Dealer"
+        else:
+            return "Tie"
+
+    def finish(self, points):
+        self.points = points
+        self.finished = True
+        self.update_score(points)
+        if self.observer:
+            self.observer.game_over(self, points)
+
+    def update_score(self, points):
+        self.score += points
+        self.num_games += 1
+
+    def average_score(self):
+        return self.score / max(self.num_games, 1)
+
+    def play(self, strategy):
+        """Play one game, asking strategy(PlayerView(game)) for each
+        decision. Returns the points scored."""
+        self.new_game()
+        while not self.finished:
+            if strategy(PlayerView(self)) == FOLD:
+                self.fold()
+            else:
+                self.stay()
+        return self.points
+
+    def run(self, strategy, n_games):
+        """Play n_games games with strategy; returns self for chaining"""
+        for _ in range(n_games):
+            self.play(strategy)
+        return self
+
+
+def always_stay(game):
+    return STAY
+
+
+def random_choice(game):
+    return game.rng.choice((STAY, FOLD))
+
+
+class Stats:
+
+    """Totals over a run of games, as kept by a Solitaire engine.
+    Stats from different runs can be added together with merge()."""
+
+    def __init__(self, num_games=0, score=0, stays=None, folds=None):
+        self.num_games = num_games
+        self.score = score
+        self.stays = list(stays or [0, 0, 0, 0])
+        self.folds = list(folds or [0, 0, 0, 0])
+
+    @classmethod
+    def of(cls, game):
+        return cls(game.num_games, game.score, game.stays, game.folds)
+
+    def __repr__(self):
+        return "Stats(num_games={}, score={}, stays={}, folds={})".format(
+            self.num_games, self.score, self.stays, self.folds)
+
+    def __eq__(self, other):
+        return vars(self) == vars(other)
+
+    def merge(self, other):
+        self.num_games += other.num_games
+        self.score += other.score
+        self.stays = [a + b for a, b in zip(self.stays, other.stays)]
+        self.folds = [a + b for a, b in zip(self.folds, other.folds)]
+        return self
+
+    def average_score(self):
+        return self.score / max(self.num_games, 1)
+
+
+BLOCK_SIZE = 10000
+
+def _play_block(strategy, seed, block, n_games):
+    # Each block of games has its own random stream, derived from the
+    # master seed and the block number alone, so how blocks are spread
+    # over workers cannot change any game. Random deals almost never
+    # repeat, so the evaluation cache would only cost time here.
+    game = Solitaire(random.Random("{}/{}".format(seed, block)), cache=None)
+    return Stats.of(game.run(strategy, n_games))
+
+
+def simulate(strategy, n_games, workers=os.cpu_count(), seed=0):
+    """Play n_games games with strategy and return their merged Stats.
+
+    Games are split into blocks of BLOCK_SIZE that are shared out over
+    workers processes, so strategy must be picklable (a module level
+    function, say). The result depends only on strategy, n_games and
+    seed, never on workers."""
+    blocks = range((n_games + BLOCK_SIZE - 1) // BLOCK_SIZE)
+    sizes = [min(BLOCK_SIZE, n_games - b * BLOCK_SIZE) for b in blocks]
+    args = ([strategy] * len(sizes), [seed] * len(sizes), blocks, sizes)
+    total = Stats()
+    if workers and workers > 1 and len(sizes) > 1:
+        with ProcessPoolExecutor(workers) as pool:
+            for stats in pool.map(_play_block, *args):
+                total.merge(stats)
+    else:
+        for stats in map(_play_block, *args):
+            total.merge(stats)
+    return total
+
+
+if __name__ == "__main__":
+    import sys, time
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    start = time.time()
+    stats = simulate(always_stay, n)
+    print(stats)
+    print("average score {:.3f}, {:.0f} games/s".format(
+        stats.average_score(), n / (time.time() - start)))